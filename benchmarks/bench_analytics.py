@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""
+Benchmark the analytics reports with NumPy against the pure Python fallback
+
+Run from the top of the repo with: python -m benchmarks.bench_analytics
+"""
+import argparse
+import random
+import timeit
+
+from nebraska import analytics
+from .common import make_account, make_categories
+
+
+def run(accounts, categories, repeat):
+    """Time building the columns and each report, returning a dict of name to seconds"""
+    built = analytics.Analytics(accounts, categories)
+    timings = {
+        "build": lambda: analytics.Analytics(accounts, categories),
+        "net": built.net,
+        "category_totals": built.category_totals,
+        "daily_balances": built.daily_balances,
+    }
+    return {name: min(timeit.repeat(function, number=1, repeat=repeat))
+            for name, function in timings.items()}
+
+
+def main():
+    """Run the benchmark and print the timings"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=50000,
+                        help="Transactions per account (default 50000).")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    accounts = [make_account("account{}".format(index), args.transactions)
+                for index in range(args.accounts)]
+    categories = make_categories()
+
+    numpy = analytics.numpy
+    results = {}
+    if numpy is not None:
+        results["numpy"] = run(accounts, categories, args.repeat)
+    else:
+        print("NumPy is not installed, only timing the pure Python fallback")
+    analytics.numpy = None
+    try:
+        results["python"] = run(accounts, categories, args.repeat)
+    finally:
+        analytics.numpy = numpy
+
+    print("{} accounts of {} transactions, best of {}".format(args.accounts, args.transactions,
+                                                             args.repeat))
+    print("{:<16}".format("") + "".join("{:>12}".format(name) for name in results))
+    for report in results["python"]:
+        print("{:<16}".format(report)
+              + "".join("{:>11.4f}s".format(timings[report]) for timings in results.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""
+Benchmark the memory held by an account's transactions as objects and as columns
+
+Compares Transaction objects with a __dict__ (as before __slots__), the
+slotted Transaction objects, and a ColumnarAccount.
+
+Run from the top of the repo with: python -m benchmarks.bench_columnar_memory
+"""
+import argparse
+import gc
+import random
+import tracemalloc
+
+from nebraska.account import Account
+from nebraska.columnar import ColumnarAccount
+from nebraska.transaction import Transaction
+from .common import make_transactions
+
+# Transaction with its attributes in a __dict__, as it was before __slots__
+DictTransaction = type("DictTransaction", Transaction.__bases__,
+                       {name: value for name, value in vars(Transaction).items()
+                        if name != "__slots__" and name not in Transaction.__slots__})
+
+
+def allocated(build):
+    """Get the result of build() and the bytes it still holds afterwards"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    """Run the benchmark and print the memory used"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=100000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    _, dict_objects = allocated(lambda: make_transactions(args.transactions, DictTransaction))
+    random.seed(0)
+    transactions, slot_objects = allocated(lambda: make_transactions(args.transactions))
+    account = Account("account", transactions)
+    _, columns = allocated(lambda: ColumnarAccount(account))
+
+    print("{} transactions".format(args.transactions))
+    for name, size in [("__dict__ objects", dict_objects),
+                       ("__slots__ objects", slot_objects),
+                       ("ColumnarAccount", columns)]:
+        print("{:<20}{:>8.2f} MiB{:>8.1f} bytes each".format(name, size / 2 ** 20,
+                                                            size / args.transactions))
+
+
+if __name__ == '__main__':
+    main()
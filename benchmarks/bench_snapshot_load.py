@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""
+Benchmark reading the json cache a line at a time against json.load
+
+Compares _read_snapshot on a cache written by _write_snapshot with the
+previous load path: json.load of an indent=4 cache followed by
+Account.from_dict for each account. Both the time taken and the peak
+memory traced by tracemalloc are measured.
+
+Run from the top of the repo with: python -m benchmarks.bench_snapshot_load
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import tempfile
+import timeit
+import tracemalloc
+
+from nebraska.account import Account
+from nebraska.common import write_json_atomic
+from nebraska.storage import _read_snapshot, _write_snapshot
+from .common import make_account, make_categories
+
+
+def json_load(path, categories):
+    """Load the accounts of an indent=4 cache the previous way"""
+    with open(path, "r") as infile:
+        return [Account.from_dict(account, categories) for account in json.load(infile)["accounts"]]
+
+
+def peak(function):
+    """Get the peak memory in bytes traced while running the function"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    """Run the benchmark and print the timings and peak memory"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=25000,
+                        help="Transactions per account (default 25000).")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    categories = make_categories()
+    accounts = [make_account("account{}".format(index), args.transactions)
+                for index in range(args.accounts)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, "snapshot.json")
+        legacy_path = os.path.join(directory, "legacy.json")
+        _write_snapshot(snapshot_path, accounts)
+        write_json_atomic(legacy_path, {"accounts": [account.to_dict() for account in accounts]},
+                          indent=4, sort_keys=True)
+
+        print("{} accounts of {} transactions, best of {}".format(args.accounts,
+                                                                 args.transactions, args.repeat))
+        for name, path, function in [("_read_snapshot", snapshot_path, _read_snapshot),
+                                     ("json.load", legacy_path, json_load)]:
+            load = functools.partial(function, path, categories)
+            seconds = min(timeit.repeat(load, number=1, repeat=args.repeat))
+            print("{:<16}{:>9.3f}s{:>9.2f} MiB peak{:>9.2f} MiB file".format(
+                name, seconds, peak(load) / 2 ** 20, os.path.getsize(path) / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+"""
+Benchmark importing nebraska.session and loading a session from the cache
+
+Each is timed in a new interpreter, with a generated cache in a temporary
+home directory.
+
+Run from the top of the repo with: python -m benchmarks.bench_startup
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from nebraska.storage import JsonStore
+from .common import make_account
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT = """
+import sys, time
+start = time.perf_counter()
+import nebraska.session
+print(time.perf_counter() - start)
+"""
+LOAD = """
+import sys, time
+import nebraska.session
+start = time.perf_counter()
+nebraska.session.Session().load()
+print(time.perf_counter() - start)
+"""
+# Dependencies of the bank nodes, which startup shouldn't need
+NODE_MODULES = ("requests", "robobrowser", "html5lib")
+
+
+def run(code, home):
+    """Run the code in a new interpreter, getting the seconds and bank node modules it printed"""
+    code += "print(' '.join(name for name in {!r} if name in sys.modules))".format(NODE_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True,
+                            env=dict(os.environ, HOME=home, PYTHONPATH=REPO_DIR),
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    lines = output.splitlines()
+    return float(lines[-2]), lines[-1].split()
+
+
+def main():
+    """Run the benchmark and print the timings"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--transactions", type=int, default=20000,
+                        help="Transactions per account (default 20000).")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as home:
+        os.mkdir(os.path.join(home, ".nebraska"))
+        JsonStore(os.path.join(home, ".nebraska", "cache.json")).save(
+            [make_account("account{}".format(index), args.transactions)
+             for index in range(args.accounts)])
+        # Let the first load create the config and categories files
+        run(LOAD, home)
+
+        print("{} accounts of {} transactions, best of {}".format(args.accounts,
+                                                                 args.transactions, args.repeat))
+        for name, code in [("import", IMPORT), ("cache load", LOAD)]:
+            results = [run(code, home) for _ in range(args.repeat)]
+            print("{:<12}{:>9.4f}s  bank node modules imported: {}".format(
+                name, min(seconds for seconds, _ in results),
+                ", ".join(results[0][1]) or "none"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Random account histories shared by the benchmarks
+"""
+import random
+
+from nebraska.account import Account
+from nebraska.category import CategoryRegistry
+from nebraska.dates import from_ordinal, to_ordinal
+from nebraska.transaction import Transaction
+
+DESCRIPTIONS = ["TESCO", "SAINSBURYS", "SALARY", "RENT", "COUNCIL TAX", "AMAZON", "TFL"]
+
+
+def make_transactions(count, transaction_class=Transaction):
+    """
+    Make a random history of the given length. Like a bank's, each description
+    is a separate string, a known description followed by a reference number.
+    """
+    day = to_ordinal("2015-01-01")
+    balance = 100000
+    transactions = []
+    for _ in range(count):
+        day += random.randint(0, 2)
+        amount = random.randint(-20000, 15000)
+        balance += amount
+        description = "{} {:06d}".format(random.choice(DESCRIPTIONS), random.randrange(10 ** 6))
+        transactions.append(transaction_class(from_ordinal(day), description, amount, balance))
+    return transactions
+
+
+def make_account(name, count):
+    """Make an account with a random history of the given length"""
+    return Account(name, make_transactions(count))
+
+
+def make_categories():
+    """Make a registry with a category for each description"""
+    categories = CategoryRegistry()
+    for description in DESCRIPTIONS:
+        categories.create(description.title().replace(" ", "")).add_description(description)
+    return categories
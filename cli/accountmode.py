@@ -49,7 +49,7 @@ class AccountPrompt(BasePrompt):
                 transaction = self._option_selection(options)
 
         if transaction is not None:
-            TransactionPrompt(self.paging_on, self.session, transaction).cmdloop()
+            TransactionPrompt(self.paging_on, self.session, self.account, transaction).cmdloop()
 
     def transactions_date(self, args):
         """
@@ -57,15 +57,17 @@ class AccountPrompt(BasePrompt):
         Usage:
             transaction date <from_date> [<to_date>]
         """
-        if len(args) == 1:
-            transactions = [t for t in self.account.get_transactions()
-                            if t.date == args[0]]
-        elif len(args) == 2:
-            transactions = [t for t in self.account.get_transactions()
-                            if args[0] <= t.date <= args[1]]
-        else:
-            print("Error: Invalid args")
-            print(self.transactions_date.__doc__)
+        try:
+            if len(args) == 1:
+                transactions = self.account.get_transactions(from_date=args[0], to_date=args[0])
+            elif len(args) == 2:
+                transactions = self.account.get_transactions(from_date=args[0], to_date=args[1])
+            else:
+                print("Error: Invalid args")
+                print(self.transactions_date.__doc__)
+                return
+        except ValueError:
+            print("Invalid date")
             return
 
         return transactions
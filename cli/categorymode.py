@@ -52,13 +52,7 @@ class CategoryPrompt(BasePrompt):
         if not name:
             category = self._option_selection(self.category.get_children())
         else:
-            for cat in self.session.categories:
-                if cat.get_name() == self.category.get_name() + "--" + name:
-                    category = cat
-                    break
-            else:
-                print("Category not found")
-                return
+            category = self.session.categories.get_category(self.category.get_name() + "--" + name)
 
         if category:
             CategoryPrompt(self.paging_on, self.session, category).cmdloop()
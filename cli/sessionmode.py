@@ -5,7 +5,9 @@ Handles the CLI mode of the bank processor
 from cli.accountmode import AccountPrompt
 from cli.categorymode import CategoryPrompt
 from cli.common import BasePrompt
+from nebraska.aggregate import net_groups
 from nebraska.category import UNKNOWN
+from nebraska.money import pence_to_pounds, pence_to_str
 
 __all__ = (
     "run"
@@ -44,13 +46,7 @@ class SessionPrompt(BasePrompt):
         if not name:
             category = self._option_selection(self.session.categories)
         else:
-            for cat in self.session.categories:
-                if cat.get_name() == name:
-                    category = cat
-                    break
-            else:
-                print("Category not found")
-                return
+            category = self.session.categories.get_category(name)
 
         if category:
             CategoryPrompt(self.paging_on, self.session, category).cmdloop()
@@ -79,18 +75,14 @@ class SessionPrompt(BasePrompt):
 
     def do_net(self, _):
         """Print the total income and expendature and the net amount"""
-        # Calculate total income and expendature
-        income = 0
-        expendature = 0
-        for transac in [t for acc in self.session.accounts for t in acc.get_transactions()]:
-            if transac.amount > 0:
-                income += transac.amount
-            else:
-                expendature += transac.amount
-        print(u"Total income: \xA3{:0.2f}".format(income))
-        print(u"Total expend:-\xA3{:0.2f}".format(abs(expendature)))
-        print(u"Net change:{}\xA3{:0.2f}".format(" -" if income < expendature else " ",
-                                                 income + expendature))
+        # Calculate total income and expendature from the monthly totals
+        income, spending = self.session.get_rollup().get_totals(group_by=())
+        income = income.get((), 0)
+        expendature = spending.get((), 0)
+        print(u"Total income: \xA3{}".format(pence_to_str(income)))
+        print(u"Total expend:-\xA3{}".format(pence_to_str(abs(expendature))))
+        print(u"Net change:{}\xA3{}".format(" -" if income < expendature else " ",
+                                            pence_to_str(income + expendature)))
 
     def do_breakdown(self, args):
         """Print the slim spending breakdown"""
@@ -104,21 +96,11 @@ class SessionPrompt(BasePrompt):
             elif args:
                 print("Invalid args")
                 return
-        income, spending = get_values_slim(self.session, from_date, to_date)
-
-        # Handle diffs
-        for income_index, income_pair in enumerate(income):
-            for spending_index, spending_pair in enumerate(spending):
-                if spending_pair[0] is income_pair[0]:
-                    if income_pair[1] > abs(spending_pair[1]):
-                        income[income_index] = (income_pair[0], income_pair[1] + spending_pair[1])
-                        del spending[spending_index]
-                    elif income_pair[1] < abs(spending_pair[1]):
-                        spending[spending_index] = (spending_pair[0], spending_pair[1] + income_pair[1])
-                        del income[income_index]
-                    else:
-                        del income[income_index]
-                        del spending[spending_index]
+        try:
+            income, spending = get_values_slim(self.session, from_date, to_date)
+        except ValueError:
+            print("Invalid date")
+            return
 
         print("Spending breakdown:")
         for pairs, name in [(income, "income"), (spending, "spending")]:
@@ -126,7 +108,8 @@ class SessionPrompt(BasePrompt):
             total = sum([pair[1] for pair in pairs])
             for pair in sorted(pairs, key=lambda p: p[0].get_name()):
                 print(u"    ({:6.2f}%) {}: \xA3{:.2f}"
-                      u"".format(100 * pair[1] / total, pair[0].get_name(), pair[1])
+                      u"".format(100 * pair[1] / total, pair[0].get_name(),
+                                 pence_to_pounds(pair[1]))
                       .replace(u"\xA3-", u"-\xA3"))
 
     def do_create_category(self, args):
@@ -140,28 +123,13 @@ class SessionPrompt(BasePrompt):
 
 
 def get_values_slim(session, from_date=None, to_date=None):
-    """Get the set of income and spending values by category"""
-    income = list()
-    spending = list()
-
-    for transac in [t for acc in session.accounts for t in acc.get_transactions()
-                    if ((not to_date or not from_date)
-                        or (to_date >= t.date >= from_date))]:
-        category = transac.get_category(session.categories)
-        values = spending if transac.amount < 0 else income
-
-        for index, entry in enumerate(values):
-            if entry[0] is category:
-                values[index] = (entry[0], entry[1] + transac.amount)
-                break
-        else:
-            values.append((category, transac.amount))
-
-    # Use the list comprehension to be able to remove from income and spending within the loop
-    for income_index, (category, value) in enumerate([i for i in income]):
-        for spending_index, pair in enumerate([s for s in spending]):
-            if category is pair[0] and value == -pair[1]:
-                del income[income_index]
-                del spending[spending_index]
-
-    return income, spending
+    """
+    Get the income and spending values in pence by category, as lists of
+    (category, value) pairs, with categories that have both netted off
+    """
+    if not to_date or not from_date:
+        from_date = to_date = None
+
+    income, spending = net_groups(*session.get_category_totals(from_date=from_date,
+                                                               to_date=to_date))
+    return list(income.items()), list(spending.items())
@@ -2,13 +2,13 @@
 Transaction CLI mode
 """
 from .common import BasePrompt
-from nebraska.category import Category
 
 class TransactionPrompt(BasePrompt):
     """Transaction level cmd prompt for the interactive mode"""
     prompt = "(Transaction) "
-    def __init__(self, paging_on, session, transaction):
+    def __init__(self, paging_on, session, account, transaction):
         super().__init__(paging_on, session)
+        self.account = account
         self.transaction = transaction
 
     def do_show(self, _):
@@ -22,4 +22,5 @@ class TransactionPrompt(BasePrompt):
         elif len(arg.split()) > 1:
             print("Too many arguments. Only one category should be specified.")
         else:
-            self.transaction.set_category_override(Category.get_category(arg))
+            self.session.set_category_override(self.account, self.transaction,
+                                               self.session.categories.get_category(arg))
@@ -4,7 +4,16 @@ nebraska banking package init
 
 __all__ = (
     "account",
+    "aggregate",
+    "analytics",
     "category",
+    "columnar",
+    "dates",
+    "money",
+    "ordering",
+    "rollup",
+    "series",
     "session",
+    "storage",
     "transaction"
 )
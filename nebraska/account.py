@@ -1,45 +1,95 @@
 """Module implementing features of a bank account"""
 
-from .transaction import Transaction, sort_transactions
+import bisect
+import collections
+
+from .dates import to_ordinal
+from .ordering import are_sequential, sort_transactions
+from .transaction import Transaction
+
+# The transactions from a fresh account which were new, duplicates or
+# conflicting when merged into an existing account
+MergeReport = collections.namedtuple("MergeReport", ["new", "duplicate", "conflicting"])
+
 
 class Account:
     """Class representing a bank account"""
-    def __init__(self, name, transactions=None):
+    def __init__(self, name, transactions=None, *, loader=None):
         self.name = name
+        # Callable returning the transactions held in a store, for accounts
+        # that are only loaded once they're used
+        self._loader = loader
         self._transactions = sort_transactions(transactions) if transactions else list()
+        self._ordinals = [transaction.ordinal for transaction in self._transactions]
+        self._unsorted = list()
 
     def __str__(self):
         return self.name
 
+    def _load(self):
+        """Load the transactions from the store if they haven't been already"""
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            for transaction in loader():
+                self.add_transaction(transaction)
+
+    def is_loaded(self):
+        """Check if the transactions have been loaded from the store"""
+        return self._loader is None
+
     def add_transaction(self, transaction):
         """Add a transaction to the list of transactions"""
-        # Can't sort here as the transactions are not necessarily added in order
-        # so will be missing some sequential elements
-        self._transactions.append(transaction)
+        self._load()
+        if (not self._unsorted
+                and (not self._transactions
+                     or are_sequential(self._transactions[-1], transaction))):
+            self._transactions.append(transaction)
+            self._ordinals.append(transaction.ordinal)
+        else:
+            # The transactions are not necessarily added in order so hold any
+            # that don't follow on until they're next needed
+            self._unsorted.append(transaction)
+
+    def _sorted_transactions(self):
+        """Get the chronologically sorted store, sorting any held transactions"""
+        self._load()
+        if self._unsorted:
+            self._transactions = sort_transactions(self._transactions + self._unsorted)
+            self._ordinals = [transaction.ordinal for transaction in self._transactions]
+            self._unsorted = list()
+        return self._transactions
 
     def get_transactions(self, *, from_date=None, to_date=None):
-        """Return the list of transactions for this account"""
-        return sort_transactions([t for t in self._transactions
-                                  if ((from_date is None or t.date >= from_date)
-                                      and (to_date is None or t.date <= to_date))
-                                 ])
+        """
+        Return the list of transactions for this account
+
+        The dates to return the transactions between (inclusive) can be given
+        as date objects or date strings.
+        """
+        transactions = self._sorted_transactions()
+        start = (0 if from_date is None
+                 else bisect.bisect_left(self._ordinals, to_ordinal(from_date)))
+        end = (len(transactions) if to_date is None
+               else bisect.bisect_right(self._ordinals, to_ordinal(to_date)))
+        return transactions[start:end]
 
     def to_dict(self):
         """Return a dict representing the account"""
+        self._load()
         return {
             "name": self.name,
             "transactions": [
                 transaction.to_dict()
-                for transaction in self._transactions
+                for transaction in self._transactions + self._unsorted
             ]
         }
 
     @staticmethod
-    def from_dict(account_dict):
+    def from_dict(account_dict, categories):
         """Create an Account object from a dict definition"""
         ret = Account(account_dict["name"])
         for transaction in account_dict["transactions"]:
-            ret.add_transaction(Transaction.from_dict(transaction))
+            ret.add_transaction(Transaction.from_dict(transaction, categories))
         return ret
 
     def dump(self):
@@ -47,19 +97,52 @@ class Account:
         print("-" * 100)
         print("| {:96} |".format(self.name.upper()))
         print("-" * 100)
-        for transaction in self._transactions:
+        for transaction in self.get_transactions():
             print(transaction)
 
     def update_from_fresh(self, fresh_account):
-        """Update the existing account with a fresh account from the web"""
+        """
+        Update the existing account with a fresh account from the web
+
+        Returns a MergeReport of the fresh transactions which were new,
+        duplicates of existing transactions, or conflicting with an existing
+        transaction in the same place in the account history (e.g. the bank
+        has since changed its description). Conflicting transactions are not
+        added to the account.
+        """
+        existing = collections.Counter()
+        slots = collections.Counter()
+        for transaction in self.get_transactions():
+            existing[transaction.fingerprint()] += 1
+            slots[_slot(transaction)] += 1
+
+        duplicate = []
+        unmatched = []
         for fresh_transaction in fresh_account.get_transactions():
-            for transaction in self.get_transactions():
-                if transaction == fresh_transaction:
-                    # This (fresh) transaction is already in the existing
-                    # account so no need to update
-                    break
+            if existing[fresh_transaction.fingerprint()]:
+                # This (fresh) transaction is already in the existing account
+                # so no need to update
+                existing[fresh_transaction.fingerprint()] -= 1
+                slots[_slot(fresh_transaction)] -= 1
+                duplicate.append(fresh_transaction)
+            else:
+                unmatched.append(fresh_transaction)
+
+        new = []
+        conflicting = []
+        for fresh_transaction in unmatched:
+            if slots[_slot(fresh_transaction)]:
+                slots[_slot(fresh_transaction)] -= 1
+                conflicting.append(fresh_transaction)
             else:
                 # Existing version of this transaction not found so add it to
                 # the existing account
-                self._transactions.append(fresh_transaction)
-        self._transactions = sort_transactions(self._transactions)
+                self.add_transaction(fresh_transaction)
+                new.append(fresh_transaction)
+
+        return MergeReport(new, duplicate, conflicting)
+
+
+def _slot(transaction):
+    """Get the key for where a transaction sits in the account history"""
+    return (transaction.date, transaction.amount_pence, transaction.balance_pence)
@@ -0,0 +1,53 @@
+"""Module implementing income and spending totals over bank accounts"""
+
+__all__ = (
+    "GROUPS",
+    "aggregate",
+    "net_groups",
+)
+
+# Name -> function getting the part of a transaction's group for that name
+GROUPS = {
+    "account": lambda account, transaction, categories: account.name,
+    "category": lambda account, transaction, categories: transaction.get_category(categories),
+    "month": lambda account, transaction, categories: "{:04d}-{:02d}".format(transaction.day.year,
+                                                                            transaction.day.month),
+}
+
+
+def aggregate(accounts, categories, *, from_date=None, to_date=None, group_by=("category",)):
+    """
+    Total the income and spending of the accounts' transactions in one pass
+
+    Returns two dicts, of income and spending in pence, keyed by the group of
+    each transaction: a tuple of its parts named in group_by (any of
+    "account", "category" and "month") in that order. Only transactions
+    between the dates (inclusive) are counted, if given.
+    """
+    groups = [GROUPS[name] for name in group_by]
+    income = {}
+    spending = {}
+    for account in accounts:
+        for transaction in account.get_transactions(from_date=from_date, to_date=to_date):
+            key = tuple(group(account, transaction, categories) for group in groups)
+            totals = spending if transaction.amount_pence < 0 else income
+            totals[key] = totals.get(key, 0) + transaction.amount_pence
+    return income, spending
+
+
+def net_groups(income, spending):
+    """
+    Net off the income and spending of the groups which have both
+
+    Returns new income and spending dicts where each group with both is kept
+    only on the side its net total falls on, or dropped if it nets to zero.
+    """
+    income = dict(income)
+    spending = dict(spending)
+    for key in income.keys() & spending.keys():
+        total = income.pop(key) + spending.pop(key)
+        if total > 0:
+            income[key] = total
+        elif total < 0:
+            spending[key] = total
+    return income, spending
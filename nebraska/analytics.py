@@ -0,0 +1,152 @@
+"""
+Module implementing reports over the columns of every account in a session
+
+The reports run over a ColumnarAccount per account. When NumPy is installed
+the columns of all the accounts are also joined into NumPy arrays, so the
+reports run as vectorised operations. Without NumPy they run as plain Python
+loops over each account's columns, or over its transactions with
+series.daily_balances() for the balances.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import series
+from .columnar import ColumnarAccount
+from .dates import from_ordinal, to_ordinal
+
+__all__ = (
+    "Analytics",
+)
+
+
+class Analytics:
+    """
+    The transactions of a list of accounts as columns, for reports
+
+    The accounts themselves are kept as source_accounts, and their columns as
+    a ColumnarAccount each in accounts. With NumPy, the accounts' columns are
+    joined one account after another into arrays of day ordinals, amounts and
+    balances in pence, and ids indexing the categories list.
+    """
+
+    def __init__(self, accounts, categories):
+        self.source_accounts = list(accounts)
+        self.accounts = [ColumnarAccount(account) for account in self.source_accounts]
+        self.categories = categories
+        if numpy is None:
+            return
+
+        self.days = self._join("days")
+        self.amounts = self._join("amounts")
+        self.balances = self._join("balances")
+
+        self.category_list = []
+        category_ids = {}
+        ids = []
+        for columns in self.accounts:
+            for index in range(len(columns)):
+                category = columns.category_of(index, categories)
+                if category not in category_ids:
+                    category_ids[category] = len(self.category_list)
+                    self.category_list.append(category)
+                ids.append(category_ids[category])
+        self.category_ids = numpy.array(ids, dtype=numpy.int64)
+
+    def _join(self, column):
+        """Join a column of every account into one NumPy array"""
+        return numpy.concatenate([numpy.asarray(getattr(columns, column), dtype=numpy.int64)
+                                  for columns in self.accounts]
+                                 + [numpy.zeros(0, dtype=numpy.int64)])
+
+    @staticmethod
+    def from_session(session):
+        """Get the columns for all the accounts in a session"""
+        return Analytics(session.accounts, session.categories)
+
+    def _selected(self, from_date, to_date):
+        """Get the NumPy indexes of the transactions between the dates (inclusive)"""
+        selected = numpy.ones(len(self.days), dtype=bool)
+        if from_date is not None:
+            selected &= self.days >= to_ordinal(from_date)
+        if to_date is not None:
+            selected &= self.days <= to_ordinal(to_date)
+        return numpy.flatnonzero(selected)
+
+    def net(self, *, from_date=None, to_date=None):
+        """Get the total income and spending in pence between the dates"""
+        if numpy is not None:
+            amounts = self.amounts[self._selected(from_date, to_date)]
+            return int(amounts[amounts > 0].sum()), int(amounts[amounts < 0].sum())
+
+        income = 0
+        spending = 0
+        for columns in self.accounts:
+            account_income, account_spending = columns.net(from_date, to_date)
+            income += account_income
+            spending += account_spending
+        return income, spending
+
+    def category_totals(self, *, from_date=None, to_date=None):
+        """
+        Get the total income and spending in pence for each category between
+        the dates, as two dicts of category to total
+        """
+        if numpy is not None:
+            selected = self._selected(from_date, to_date)
+            amounts = self.amounts[selected]
+            ids = self.category_ids[selected]
+            ret = []
+            for side in (amounts >= 0, amounts < 0):
+                totals = numpy.zeros(len(self.category_list), dtype=numpy.int64)
+                numpy.add.at(totals, ids[side], amounts[side])
+                counts = numpy.bincount(ids[side], minlength=len(self.category_list))
+                ret.append({self.category_list[index]: int(totals[index])
+                            for index in numpy.flatnonzero(counts)})
+            return tuple(ret)
+
+        income = {}
+        spending = {}
+        for columns in self.accounts:
+            account_income, account_spending = columns.category_totals(self.categories,
+                                                                       from_date, to_date)
+            for totals, account_totals in [(income, account_income),
+                                           (spending, account_spending)]:
+                for category, total in account_totals.items():
+                    totals[category] = totals.get(category, 0) + total
+        return income, spending
+
+    def daily_balances(self, *, from_date=None, to_date=None):
+        """
+        Get the balance at the end of each day, in the same form as
+        series.daily_balances()
+        """
+        if numpy is None:
+            return series.daily_balances(self.source_accounts,
+                                         from_date=from_date, to_date=to_date)
+
+        held = [columns for columns in self.accounts if len(columns)]
+        if not held:
+            return [], {"total": []}
+
+        start = (min(columns.days[0] for columns in held)
+                 if from_date is None else to_ordinal(from_date))
+        end = (max(columns.days[-1] for columns in held)
+               if to_date is None else to_ordinal(to_date))
+        every_day = numpy.arange(start, end + 1)
+
+        balances = {}
+        total = numpy.zeros(len(every_day), dtype=numpy.int64)
+        for columns in held:
+            account_days = numpy.asarray(columns.days, dtype=numpy.int64)
+            latest = numpy.searchsorted(account_days, every_day, side="right") - 1
+            balance = numpy.where(latest >= 0,
+                                  numpy.asarray(columns.balances,
+                                                dtype=numpy.int64)[numpy.maximum(latest, 0)],
+                                  columns.opening_balance())
+            total += balance
+            balances[columns.name] = (balance / 100).tolist()
+        balances["total"] = (total / 100).tolist()
+        return [from_ordinal(day) for day in range(start, end + 1)], balances
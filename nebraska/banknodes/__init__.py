@@ -1,8 +1,18 @@
 """
 nebraska banknodes package init
+
+Each node is a module providing a download(config, from_date, to_date) method
+returning a list of accounts. The nodes are only imported when a download is
+run, so loading a session from the cache doesn't import their dependencies.
 """
+import importlib
 
 __all__ = (
     "lloyds",
     "santander"
 )
+
+
+def load_download_method(name):
+    """Import the bank node with the given name and get its download method"""
+    return importlib.import_module("." + name, __name__).download
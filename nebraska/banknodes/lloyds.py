@@ -2,21 +2,26 @@
 Download transaction history from Lloyds Bank website
 """
 
+import concurrent.futures
 import csv
 import datetime
 import getpass
+import io
 import os
+import urllib.parse
 
 from robobrowser import RoboBrowser
 
 from ..account import Account
-from ..session import download_method
+from ..money import to_pence
 from ..transaction import Transaction
 
 __all__ = (
     "download"
 )
 
+LOGIN_URL = 'https://online.lloydsbank.co.uk/personal/logon/login.jsp?WT.ac=hpIBlogon'
+
 
 def prompt(prompt_message, password=False):
     """Prompt the user for some input"""
@@ -27,11 +32,11 @@ def prompt(prompt_message, password=False):
     return val
 
 
-def download_internal(user_id, from_date, to_date):
-    """Download the csv files for the transaction between the given dates"""
+def download_internal(user_id, from_date, to_date, workers, archive_dir=None):
+    """Download the transactions between the given dates for each account"""
     # Create the browser and open the lloyds login page
     browser = RoboBrowser(parser='html5lib')
-    browser.open('https://online.lloydsbank.co.uk/personal/logon/login.jsp?WT.ac=hpIBlogon')
+    browser.open(LOGIN_URL)
 
     while 'Enter Memorable Information' not in browser.parsed.title.text:
         print(browser.parsed.title.text)
@@ -57,25 +62,44 @@ def download_internal(user_id, from_date, to_date):
         if link.text == "View statement":
             links.append(link)
 
-    # loop through all accounts
-    for index, link in enumerate(links):
-        acc_name = link['data-wt-ac'].split(" resource")[0]
-        print(acc_name)
-        print(browser.parsed.title)
-        browser.follow_link(link)
-        yield acc_name, download_account_internal(browser, from_date, to_date)
-        browser.back()
-
-
-def download_account_internal(browser, from_date, to_date):
-    """Return the list of csv files downloaded for this account"""
+    # Each account's export page is opened in turn, as the site may track the
+    # selected account, then its ranges are exported by a pool of workers
+    # sharing the logged in session
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for link in links:
+            acc_name = link['data-wt-ac'].split(" resource")[0]
+            print(acc_name)
+            browser.follow_link(link)
+            exports = export_requests(browser, from_date, to_date)
+            downloads = [executor.submit(download_range, browser.session, export,
+                                         f_date, t_date, archive_dir)
+                         for export, f_date, t_date in exports]
+            ranges = [download.result() for download in downloads]
+            browser.back()
+            yield acc_name, ranges
+
+
+def export_requests(browser, from_date, to_date):
+    """
+    Get the requests to export each range of the account from a browser on its
+    statement page, leaving the browser back on the statement page
+    """
     print(browser.parsed.title.text)
     export_link = browser.get_link('Export', id='lnkExportStatementSSR')
     browser.follow_link(export_link)
+    print(browser.parsed.title.text)
+
+    form = browser.get_form('export-statement-form')
+    method = form.method.upper()
+    url = urllib.parse.urljoin(browser.url, form.action)
 
     ret = []
     for (f_date, t_date) in split_range(from_date, to_date):
-        ret.append(download_range(browser, f_date, t_date))
+        form["exportDateRange"] = "between"
+        form["searchDateTo"] = t_date.strftime("%d/%m/%Y")
+        form["searchDateFrom"] = f_date.strftime("%d/%m/%Y")
+        form["export-format"] = "Internet banking text/spreadsheet (.CSV)"
+        ret.append(((method, url, form.serialize().to_requests(method)), f_date, t_date))
 
     browser.back()
     return ret
@@ -95,75 +119,76 @@ def split_range(from_date, to_date):
     yield (from_date, to_date)
 
 
-def download_range(browser, from_date, to_date):
+def download_range(session, export, from_date, to_date, archive_dir=None):
     """
-    Download an individual csv file from a browser on the accounts Export page
+    Download the transactions for an individual range using a request from
+    export_requests, saving the raw csv file to the archive_dir if given
     """
-    print(browser.parsed.title.text)
     print('Exporting {0} to {1}'.format(from_date, to_date))
 
-    form = browser.get_form('export-statement-form')
-    form["exportDateRange"] = "between"
-    form["searchDateTo"] = to_date.strftime("%d/%m/%Y")
-    form["searchDateFrom"] = from_date.strftime("%d/%m/%Y")
-    form["export-format"] = "Internet banking text/spreadsheet (.CSV)"
-    browser.submit_form(form)
+    method, url, kwargs = export
+    response = session.request(method, url, **kwargs)
 
-    if browser.response.headers["Content-Type"] != 'application/csv':
+    if response.headers.get("Content-Type") != 'application/csv':
         print("No transactions could be downloaded for this range.")
-        return None
+        return []
 
-    disposition = browser.response.headers['Content-Disposition']
-    prefix = 'attachment; filename='
-    if not disposition.startswith(prefix):
-        raise Exception('Missing "Content-Disposition: attachment" header')
+    if archive_dir is not None:
+        disposition = response.headers['Content-Disposition']
+        prefix = 'attachment; filename='
+        if not disposition.startswith(prefix):
+            raise Exception('Missing "Content-Disposition: attachment" header')
 
-    suggested_prefix, ext = os.path.splitext(disposition[len(prefix):])
-    filename = '{0}_{1:%Y-%m-%d}_{2:%Y-%m-%d}{3}'.format(
-        suggested_prefix, from_date, to_date, ext)
+        suggested_prefix, ext = os.path.splitext(disposition[len(prefix):])
+        filename = os.path.join(archive_dir, '{0}_{1:%Y-%m-%d}_{2:%Y-%m-%d}{3}'.format(
+            suggested_prefix, from_date, to_date, ext))
 
-    with open(filename, 'a') as csv_file:
-        for line in browser.response.text:
-            csv_file.write(line)
+        with open(filename, 'w') as csv_file:
+            csv_file.write(response.text)
 
-    print('Saved transactions to "{0}"'.format(filename))
+        print('Saved transactions to "{0}"'.format(filename))
+
+    return list(parse_csv(response.text))
 
-    browser.back()
-    return filename
+
+def parse_csv(text):
+    """Parse the transactions from the text of an exported csv file"""
+    csvreader = csv.reader(io.StringIO(text))
+    # Skip the header row
+    next(csvreader, None)
+    for row in csvreader:
+        if not row:
+            continue
+        date_raw = row[0].split("/")
+        date = "{}-{}-{}".format(date_raw[2], date_raw[1], date_raw[0])
+        desc = row[4]
+        if row[5] != "":
+            amount = -to_pence(row[5])
+        else:
+            amount = to_pence(row[6])
+        balance = to_pence(row[7])
+        yield Transaction(date, desc, amount, balance)
 
 
-@download_method
 def download(config, from_date, to_date):
     """Main flow of the lloyds account processing"""
     if "ids" not in config or "lloyds" not in config["ids"]:
         print("Lloyds ID not in config, skipping. See README for help.")
         return []
 
+    archive_dir = config.get("archive_dir")
+    if archive_dir is not None and not os.path.exists(archive_dir):
+        os.makedirs(archive_dir)
+
     accounts = []
-    for acc_name, filenames in download_internal(user_id=config["ids"]["lloyds"],
-                                                 from_date=from_date,
-                                                 to_date=to_date):
+    for acc_name, ranges in download_internal(user_id=config["ids"]["lloyds"],
+                                              from_date=from_date,
+                                              to_date=to_date,
+                                              workers=config.get("workers", {}).get("lloyds", 4),
+                                              archive_dir=archive_dir):
         accounts.append(Account("lloyds-" + acc_name))
         account = accounts[-1]
-        for filename in filenames:
-            if filename is None:
-                continue
-
-            with open(filename, 'r') as fileopen:
-                csvreader = csv.reader(fileopen)
-                firstrow = True
-                for row in csvreader:
-                    if firstrow:
-                        firstrow = False
-                        continue
-                    date_raw = row[0].split("/")
-                    date = "{}-{}-{}".format(date_raw[2], date_raw[1], date_raw[0])
-                    desc = row[4]
-                    if row[5] != "":
-                        amount = -float(row[5])
-                    else:
-                        amount = float(row[6])
-                    balance_after = float(row[7])
-                    account.add_transaction(Transaction(date, desc, amount, balance_after))
-            os.remove(filename)
+        for transactions in ranges:
+            for transaction in transactions:
+                account.add_transaction(transaction)
     return accounts
@@ -2,49 +2,104 @@
 Download transaction history from Santander via tellers
 """
 
-import datetime
+import random
+import threading
 import time
 
 import requests
+import requests.adapters
 
 from ..account import Account
-from ..session import download_method
+from ..money import to_pence
 from ..transaction import Transaction
 
+TELLER_URL = "https://api.teller.io"
+# Seconds to wait for the teller API to connect or respond
+TIMEOUT = 30
+# Attempts at each request, waiting a random time up to the backoff (doubling
+# from BACKOFF up to BACKOFF_LIMIT seconds) between each
+ATTEMPTS = 5
+BACKOFF = 1
+BACKOFF_LIMIT = 30
+# Responses which are worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Number of transactions to request per page
+PAGE_SIZE = 250
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _session(api_key):
+    """Get the shared HTTP session for the teller API key"""
+    with _SESSIONS_LOCK:
+        if api_key not in _SESSIONS:
+            session = requests.Session()
+            session.mount(TELLER_URL, requests.adapters.HTTPAdapter(pool_maxsize=4))
+            session.headers['Authorization'] = 'Bearer ' + api_key
+            _SESSIONS[api_key] = session
+        return _SESSIONS[api_key]
+
+
+def _get(session, url, **params):
+    """Get the json response from the teller API, retrying on failures"""
+    for attempt in range(ATTEMPTS):
+        try:
+            res = session.get(url, params=params, timeout=TIMEOUT)
+            if res.status_code not in RETRY_STATUSES:
+                res.raise_for_status()
+                return res.json()
+            error = "HTTP {}".format(res.status_code)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+            error = err.__class__.__name__
+        if attempt == ATTEMPTS - 1:
+            raise Exception("Teller request failed after {} attempts: {}".format(ATTEMPTS, error))
+
+        delay = random.uniform(0, min(BACKOFF_LIMIT, BACKOFF * 2 ** attempt))
+        print("{}, retrying in {:.1f}".format(error, delay))
+        time.sleep(delay)
+
+
+def _get_transactions(session, url, from_date):
+    """
+    Get the transactions from the teller API, newest first, a page at a time
+    until reaching those before from_date. Transactions already fetched are
+    skipped, and fetching stops at a page with none that are new, in case the
+    API ignores from_id.
+    """
+    params = {"count": PAGE_SIZE}
+    seen = set()
+    while True:
+        page = _get(session, url, **params)
+        new = [transac for transac in page if transac["id"] not in seen]
+        seen.update(transac["id"] for transac in new)
+        yield from new
+
+        if len(page) < PAGE_SIZE or not new or page[-1]["date"] < str(from_date):
+            return
+        params["from_id"] = page[-1]["id"]
+
 
-@download_method
 def download(config, from_date, to_date):
     """Main flow of the santander account processing"""
     if "keys" not in config or "teller" not in config["keys"]:
         print("Teller API key not in config, skipping. See README for help.")
         return []
 
+    session = _session(config["keys"]["teller"])
     # Get the current accounts information from teller
-    success = False
-    while not success:
-        try:
-            headers = {'Authorization': 'Bearer ' + config["keys"]["teller"]}
-            res = requests.get('https://api.teller.io/accounts', headers=headers)
-            # Teller doesn't currently support multiple santander accounts, instead duplicating the same.
-            # Just take the first account for now, in future this should be looped
-            res = requests.get(res.json()[0]["links"]["transactions"], headers=headers)
-            success = True
-        except requests.exceptions.ConnectionError:
-            print("Retrying in 1")
-            time.sleep(1)
-
-    transactions = res.json()
+    accounts = _get(session, TELLER_URL + '/accounts')
+    # Teller doesn't currently support multiple santander accounts, instead duplicating the same.
+    # Just take the first account for now, in future this should be looped
+    transactions = _get_transactions(session, accounts[0]["links"]["transactions"], from_date)
+
     account = Account("santander")
     for transac in transactions:
-        transac['amount'] = float(transac['amount'])
-        transac['running_balance'] = float(transac['running_balance'])
-
-        date = transac["date"].split("-")
-        date = datetime.date(int(date[0]), int(date[1]), int(date[2]))
-        if from_date <= date <= to_date:
-            account.add_transaction(Transaction(transac["date"],
-                                                transac["description"],
-                                                transac["amount"],
-                                                transac["running_balance"],
-                                                counterparty=transac["counterparty"]))
+        transaction = Transaction(transac["date"],
+                                  transac["description"],
+                                  to_pence(transac["amount"]),
+                                  to_pence(transac["running_balance"]),
+                                  counterparty=transac["counterparty"])
+        if from_date <= transaction.day <= to_date:
+            account.add_transaction(transaction)
     return [account]
@@ -3,29 +3,75 @@
 
 class Category:
     """Class representing a transaction category"""
-    _categories = []
 
-    def __init__(self, name, *, parent=None, diff=False):
-        Category._categories.append(self)
+    def __init__(self, name, *, parent=None, diff=False, registry=None):
         self._name = name
+        self._full_name = None
         self.descriptions = []
         self.counterparts = []
         self.diff = diff
 
         self.children = []
-        self.parent = parent
+        self._parent = parent
         if parent:
             parent.children.append(self)
+        # The registry of the session this category belongs to, if any
+        self.registry = parent.registry if parent else registry
+        if self.registry is not None:
+            self.registry.register(self)
 
     def __str__(self):
         return "Category({})".format(self.get_name())
 
+    @property
+    def name(self):
+        """The name of this category, without its parent's name"""
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+        self._names_changed()
+
+    @property
+    def parent(self):
+        """The parent of this category, if any"""
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent):
+        if self._parent:
+            self._parent.children.remove(self)
+        self._parent = parent
+        if parent:
+            parent.children.append(self)
+        self._names_changed()
+        if self.registry is not None:
+            self.registry.moved(self)
+
+    def _names_changed(self):
+        """Forget the cached full names of this category and its descendants"""
+        stack = [self]
+        while stack:
+            category = stack.pop()
+            category._full_name = None
+            stack.extend(category.children)
+        if self.registry is not None:
+            self.registry.renamed()
+
+    def _changed(self):
+        """Note that the descriptions or counterparts of this category changed"""
+        if self.registry is not None:
+            self.registry.revision += 1
+
     def get_name(self):
         """Get the full name of this category (including parent name)"""
-        if self.parent:
-            return "{}--{}".format(self.parent.get_name(), self._name)
-        else:
-            return self._name
+        if self._full_name is None:
+            if self._parent:
+                self._full_name = "{}--{}".format(self._parent.get_name(), self._name)
+            else:
+                self._full_name = self._name
+        return self._full_name
 
     def get_children(self):
         """Get the list of child categories for this category"""
@@ -38,10 +84,12 @@ class Category:
     def add_description(self, desc_string):
         """Add a description string to this category"""
         self.descriptions.append(desc_string)
+        self._changed()
 
     def add_counterpart(self, counterpart):
         """Add a counterpart to this category"""
         self.counterparts.append(counterpart)
+        self._changed()
 
     def to_dict(self):
         """Create a dict representing this category object"""
@@ -53,45 +101,216 @@ class Category:
         if self.children:
             ret["children"] = dict()
             for child in self.children:
-                ret["children"][child.get_name()] = child.to_dict()
+                ret["children"][child.name] = child.to_dict()
         if self.diff:
             ret["diff"] = True
         return ret
 
     @staticmethod
-    def from_dict(name, category_dict, *, parent=None):
+    def from_dict(name, category_dict, *, parent=None, registry=None):
         """Create a new category object from the dict"""
-        ret = Category(name, parent=parent)
+        ret = Category(name, parent=parent, registry=registry)
         if "descriptions" in category_dict:
             ret.descriptions = category_dict["descriptions"]
         if "counterparts" in category_dict:
             ret.counterparts = category_dict["counterparts"]
         if "children" in category_dict:
+            # Children used to be saved under their full names, which then
+            # nested the parent's name again on every load, so strip it off
+            prefix = ret.get_name() + "--"
             for childname in category_dict["children"]:
-                Category.from_dict(childname, category_dict["children"][childname], parent=ret)
+                name = childname
+                while name.startswith(prefix):
+                    name = name[len(prefix):]
+                Category.from_dict(name, category_dict["children"][childname], parent=ret)
         if "diff" in category_dict and category_dict["diff"]:
             ret.diff = True
+        ret._changed()
         return ret
 
     @staticmethod
     def from_description(categories, *, description=None, counterparty=None):
         """Get the category from the given descriptions and/or counterparty"""
-        for category in categories:
-            if (counterparty is not None and counterparty in category.counterparts
-                    or any([description.startswith(desc)
-                            for desc in category.descriptions])):
-                return category
+        return CategoryMatcher.compile(categories).match(description=description,
+                                                         counterparty=counterparty)
+
+
+class CategoryRegistry:
+    """
+    The categories of a session
+
+    Iterating, indexing and len() go over the top level categories, in the
+    order they were created. Every category in the tree can be looked up by
+    its full name, and the registry's revision is incremented whenever the
+    categories are created, renamed, moved or change what they match.
+    """
+
+    def __init__(self):
+        self._roots = []
+        self._categories = []
+        # Full name -> category, for the first category registered with each
+        # name. Rebuilt when a category is renamed or moved
+        self._by_name = {}
+        self.revision = 0
+        self._matcher = None
+
+    def __iter__(self):
+        return iter(self._roots)
+
+    def __len__(self):
+        return len(self._roots)
+
+    def __getitem__(self, index):
+        return self._roots[index]
+
+    @staticmethod
+    def from_dict(categories_dict):
+        """Create a registry of the categories in the dict of name to category dict"""
+        ret = CategoryRegistry()
+        for name in categories_dict:
+            Category.from_dict(name, categories_dict[name], registry=ret)
+        return ret
+
+    def to_dict(self):
+        """Create a dict of name to category dict for the top level categories"""
+        return {category.get_name(): category.to_dict() for category in self._roots}
+
+    def create(self, name):
+        """Create a new top level category with the given name"""
+        return Category(name, registry=self)
+
+    def register(self, category):
+        """Add a newly created category to the registry"""
+        self._categories.append(category)
+        if category.parent is None:
+            self._roots.append(category)
+        if self._by_name is not None:
+            self._by_name.setdefault(category.get_name(), category)
+        self.revision += 1
+
+    def renamed(self):
+        """Note that the full names of some categories have changed"""
+        self._by_name = None
+        self.revision += 1
+
+    def moved(self, category):
+        """Note that a category has been moved to a different parent"""
+        if category.parent is None and category not in self._roots:
+            self._roots.append(category)
+        elif category.parent is not None and category in self._roots:
+            self._roots.remove(category)
+        self.revision += 1
+
+    def get_category(self, name):
+        """Get an existing category by its full name"""
+        if self._by_name is None:
+            self._by_name = {}
+            for category in self._categories:
+                self._by_name.setdefault(category.get_name(), category)
+
+        category = self._by_name.get(name)
+        if category is None:
+            category = self._legacy_category(name)
+        if category is None:
+            if name == UNKNOWN.get_name():
+                return UNKNOWN
+            print("Failed to find category {}".format(name))
+        return category
 
-        return UNKNOWN
+    def _legacy_category(self, name):
+        """
+        Get a category by a full name saved when children were stored under
+        their full names, e.g. "Food--Food--Fast" for "Food--Fast", skipping
+        the parts which repeat the names of its ancestors
+        """
+        parts = name.split("--")
+        category = self._by_name.get(parts[0])
+        if category is None or category.parent is not None:
+            return None
+        for part in parts[1:]:
+            ancestors = []
+            ancestor = category
+            while ancestor is not None:
+                ancestors.append(ancestor.name)
+                ancestor = ancestor.parent
+            children = [child for child in category.children if child.name == part]
+            if children:
+                category = children[0]
+            elif part not in ancestors:
+                return None
+        return category
+
+    def matcher(self):
+        """Get the matcher for the top level categories, rebuilt if they've changed"""
+        if self._matcher is None or self._matcher[0] != self.revision:
+            self._matcher = (self.revision, CategoryMatcher(self._roots))
+        return self._matcher[1]
+
+
+class CategoryMatcher:
+    """
+    Compiled index of the descriptions and counterparts of a list of categories
+
+    The first category in the list with a matching counterpart or description
+    prefix wins. Description prefixes are held in a trie so matching a
+    description walks it once rather than checking every prefix. Each match is
+    remembered, so later transactions with the same description and
+    counterparty cost a single dict lookup until the matcher is rebuilt.
+    """
+    _END = None
+
+    def __init__(self, categories):
+        self._categories = list(categories)
+        self._counterparts = {}
+        self._prefixes = {}
+        self._resolved = {}
+        for priority, category in enumerate(self._categories):
+            for counterpart in category.counterparts:
+                self._counterparts.setdefault(counterpart, priority)
+            for desc in category.descriptions:
+                node = self._prefixes
+                for char in desc:
+                    node = node.setdefault(char, {})
+                node.setdefault(CategoryMatcher._END, priority)
 
     @staticmethod
-    def get_category(name):
-        """Get an existing category from the list"""
-        for category in Category._categories:
-            if category.get_name() == name:
-                return category
+    def compile(categories):
+        """
+        Get the matcher for a registry or list of categories
+
+        A registry's matcher is reused until a category is created, moved or
+        has a description or counterpart added. A list is compiled afresh.
+        """
+        if isinstance(categories, CategoryRegistry):
+            return categories.matcher()
+        return CategoryMatcher(categories)
+
+    def match(self, *, description=None, counterparty=None):
+        """Get the category from the given description and/or counterparty"""
+        key = (description, counterparty)
+        category = self._resolved.get(key)
+        if category is None:
+            category = self._match(description, counterparty)
+            self._resolved[key] = category
+        return category
+
+    def _match(self, description, counterparty):
+        """Find the category from the counterpart index and prefix trie"""
+        best = None
+        if counterparty is not None:
+            best = self._counterparts.get(counterparty)
+
+        if description is not None:
+            node = self._prefixes
+            index = 0
+            while node is not None:
+                priority = node.get(CategoryMatcher._END)
+                if priority is not None and (best is None or priority < best):
+                    best = priority
+                node = node.get(description[index]) if index < len(description) else None
+                index += 1
 
-        print("Failed to find category {}".format(name))
+        return UNKNOWN if best is None else self._categories[best]
 
 
 # GLOBAL
@@ -0,0 +1,82 @@
+"""Module implementing a compact column-wise view of account transactions"""
+
+import array
+import bisect
+import sys
+
+from .category import Category
+from .dates import to_ordinal
+
+__all__ = (
+    "ColumnarAccount",
+)
+
+
+class ColumnarAccount:
+    """
+    Column-wise copy of the transactions of an account for reports
+
+    Each column is a flat array in date order: dates as day ordinals, amounts
+    and balances as integer pence, and interned descriptions and counterparts.
+    Category overrides are held only for the transactions which have one.
+    """
+
+    def __init__(self, account):
+        transactions = account.get_transactions()
+        self.name = account.name
+        self.days = array.array("q", (t.ordinal for t in transactions))
+        self.amounts = array.array("q", (t.amount_pence for t in transactions))
+        self.balances = array.array("q", (t.balance_pence for t in transactions))
+        self.descriptions = [sys.intern(t.description) for t in transactions]
+        self.counterparties = [t.counterparty and sys.intern(t.counterparty)
+                               for t in transactions]
+        self.overrides = {index: t.get_category_override()
+                          for index, t in enumerate(transactions)
+                          if t.get_category_override()}
+
+    def __len__(self):
+        return len(self.days)
+
+    def opening_balance(self):
+        """Get the balance before the first transaction in pence"""
+        return self.balances[0] - self.amounts[0] if len(self) else 0
+
+    def category_of(self, index, categories):
+        """Get the category of the transaction at an index"""
+        category = self.overrides.get(index)
+        if category is None:
+            category = Category.from_description(categories,
+                                                 description=self.descriptions[index],
+                                                 counterparty=self.counterparties[index])
+        return category
+
+    def bounds(self, from_date=None, to_date=None):
+        """Get the slice of indexes of the transactions between the dates"""
+        start = 0 if from_date is None else bisect.bisect_left(self.days, to_ordinal(from_date))
+        end = len(self) if to_date is None else bisect.bisect_right(self.days, to_ordinal(to_date))
+        return slice(start, end)
+
+    def net(self, from_date=None, to_date=None):
+        """Get the total income and spending in pence between the dates"""
+        income = 0
+        spending = 0
+        for amount in self.amounts[self.bounds(from_date, to_date)]:
+            if amount > 0:
+                income += amount
+            else:
+                spending += amount
+        return income, spending
+
+    def category_totals(self, categories, from_date=None, to_date=None):
+        """
+        Get the total income and spending in pence for each category between
+        the dates, as two dicts of category to total
+        """
+        income = {}
+        spending = {}
+        for index in range(len(self))[self.bounds(from_date, to_date)]:
+            category = self.category_of(index, categories)
+            amount = self.amounts[index]
+            totals = spending if amount < 0 else income
+            totals[category] = totals.get(category, 0) + amount
+        return income, spending
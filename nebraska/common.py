@@ -1,6 +1,8 @@
 """
 Private common utilities for the banking package
 """
+import contextlib
+import json
 import os
 
 NEBRASKA_DIR = os.path.join(os.path.expanduser("~"), ".nebraska")
@@ -8,3 +10,27 @@ NEBRASKA_DIR = os.path.join(os.path.expanduser("~"), ".nebraska")
 CATEGORIES_FILE = os.path.join(NEBRASKA_DIR, "known_descriptions.json")
 CONFIG_FILE = os.path.join(NEBRASKA_DIR, "config.json")
 CACHE_FILE = os.path.join(NEBRASKA_DIR, "cache.json")
+DATABASE_FILE = os.path.join(NEBRASKA_DIR, "cache.sqlite3")
+JOURNAL_FILE = os.path.join(NEBRASKA_DIR, "cache.journal")
+SYNC_FILE = os.path.join(NEBRASKA_DIR, "sync.json")
+ROLLUP_FILE = os.path.join(NEBRASKA_DIR, "rollup.json")
+
+
+@contextlib.contextmanager
+def open_atomic(path):
+    """
+    Open a file for writing which only replaces any existing file at the path
+    once it has been completely written
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as outfile:
+        yield outfile
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(temp_path, path)
+
+
+def write_json_atomic(path, data, **kwargs):
+    """Write the data to a json file, replacing any existing file atomically"""
+    with open_atomic(path) as outfile:
+        json.dump(data, outfile, **kwargs)
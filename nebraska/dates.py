@@ -0,0 +1,32 @@
+"""
+Module converting transaction dates to date objects and day ordinals
+
+Transaction dates are stored as ISO strings (e.g. "2018-01-31", possibly
+followed by a time) and parsed once when the transaction is created, so
+ranges and days can be compared as integer ordinals.
+"""
+
+import datetime
+
+__all__ = (
+    "from_ordinal",
+    "parse_date",
+    "to_ordinal",
+)
+
+
+def parse_date(date_string):
+    """Get the date object for a transaction date string"""
+    return datetime.date.fromisoformat(date_string[:10])
+
+
+def to_ordinal(date):
+    """Get the day ordinal of a date object or a transaction date string"""
+    if isinstance(date, str):
+        date = parse_date(date)
+    return date.toordinal()
+
+
+def from_ordinal(ordinal):
+    """Get the ISO date string of a day ordinal"""
+    return datetime.date.fromordinal(ordinal).isoformat()
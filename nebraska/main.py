@@ -3,8 +3,14 @@
 Main script for running the bank processor
 """
 import argparse
+import contextlib
+import csv
+import json
+import sys
 
-from cli.sessionmode import SessionPrompt
+from .aggregate import net_groups
+from .dates import parse_date
+from .money import pence_to_pounds
 from .session import Session
 
 
@@ -13,18 +19,130 @@ from .session import Session
 ###########################################################
 def parseargs():
     """Parse the cli arguments"""
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(
+        epilog="Without a command the interactive prompt is started.")
     parser.add_argument('-c', '--cache', action='store_true',
                         help="Use the saved transactions file instead of "
                              "downloading from the web.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    def add_output_args(command_parser):
+        """Add the date range and output format arguments to a command"""
+        command_parser.add_argument('--from', dest="from_date", type=parse_date,
+                                    help="Only include transactions on or after this date.")
+        command_parser.add_argument('--to', dest="to_date", type=parse_date,
+                                    help="Only include transactions on or before this date.")
+        command_parser.add_argument('--format', choices=("json", "csv"), default="json",
+                                    help="Output format (default json).")
+
+    report = commands.add_parser("report", help="Print a report from the cache and exit.")
+    reports = report.add_subparsers(dest="report", metavar="report")
+    reports.required = True
+    add_output_args(reports.add_parser("net", help="Total income, spending and net change."))
+    add_output_args(reports.add_parser("breakdown",
+                                       help="Income and spending by category."))
+    add_output_args(commands.add_parser("export",
+                                        help="Print the cached transactions and exit."))
+    commands.add_parser("sync", help="Download the latest transactions, save them and exit.")
     return parser.parse_args()
 
 
+###########################################################
+# BATCH COMMANDS
+###########################################################
+def _load_session(download=False):
+    """Load the session, sending any progress messages to stderr"""
+    session = Session()
+    with contextlib.redirect_stdout(sys.stderr):
+        session.load(download=download)
+    return session
+
+
+def _write(result, fields, rows, output_format):
+    """Write the result of a command to stdout as json, or its rows as csv"""
+    if output_format == "csv":
+        writer = csv.DictWriter(sys.stdout, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(result, sys.stdout, indent=4)
+        print("")
+
+
+def report_net(args):
+    """Print the total income, spending and net change"""
+    session = _load_session()
+    income, spending = session.get_category_totals(from_date=args.from_date,
+                                                   to_date=args.to_date)
+    income = sum(income.values())
+    spending = sum(spending.values())
+    row = {"income": pence_to_pounds(income),
+           "spending": pence_to_pounds(spending),
+           "net": pence_to_pounds(income + spending)}
+    _write(row, ["income", "spending", "net"], [row], args.format)
+
+
+def report_breakdown(args):
+    """Print the income and spending by category, netted off"""
+    session = _load_session()
+    income, spending = net_groups(*session.get_category_totals(from_date=args.from_date,
+                                                               to_date=args.to_date))
+    result = {}
+    rows = []
+    for name, totals in [("income", income), ("spending", spending)]:
+        result[name] = [{"category": category.get_name(), "amount": pence_to_pounds(total)}
+                        for category, total in sorted(totals.items(),
+                                                      key=lambda item: item[0].get_name())]
+        rows.extend(dict(row, type=name) for row in result[name])
+    _write(result, ["type", "category", "amount"], rows, args.format)
+
+
+def export(args):
+    """Print every transaction in the cache"""
+    session = _load_session()
+    rows = []
+    for account in session.accounts:
+        for transaction in account.get_transactions(from_date=args.from_date,
+                                                    to_date=args.to_date):
+            rows.append({"account": account.name,
+                         "date": transaction.date,
+                         "description": transaction.description,
+                         "counterparty": transaction.counterparty,
+                         "amount": transaction.amount,
+                         "balance_after": transaction.balance_after,
+                         "category": transaction.get_category(session.categories).get_name()})
+    _write(rows, ["account", "date", "description", "counterparty", "amount",
+                  "balance_after", "category"], rows, args.format)
+
+
+def sync(_):
+    """Download the latest transactions, save them, and print the new counts"""
+    session = _load_session()
+    with contextlib.redirect_stdout(sys.stderr):
+        added = session.update()
+        session.save()
+    _write(added, None, None, "json")
+
+
+COMMANDS = {
+    ("report", "net"): report_net,
+    ("report", "breakdown"): report_breakdown,
+    ("export", None): export,
+    ("sync", None): sync,
+}
+
+
 ###########################################################
 # MAIN
 ###########################################################
 def main(args):
     """Run the main method"""
+    if args.command is not None:
+        COMMANDS[(args.command, getattr(args, "report", None))](args)
+        return
+
+    # Only the interactive prompt needs the cli modules
+    from cli.sessionmode import SessionPrompt
     session = Session()
     session.load(download=not args.cache)
     SessionPrompt(False, session).cmdloop()
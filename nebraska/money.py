@@ -0,0 +1,38 @@
+"""
+Module converting money values to and from integer pence
+
+Amounts and balances are held as integer pence so they can be added and
+compared exactly. Values are only converted to and from pounds at the edges:
+when parsing downloads, reading and writing json, and displaying.
+"""
+
+import decimal
+
+__all__ = (
+    "pence_to_pounds",
+    "pence_to_str",
+    "to_pence",
+)
+
+
+def to_pence(value):
+    """
+    Convert an amount in pounds to integer pence
+
+    Strings (e.g. "-12.34" from a bank export) are converted exactly, numbers
+    (e.g. from json) are rounded to the nearest penny.
+    """
+    if isinstance(value, str):
+        pence = decimal.Decimal(value.replace(",", "")) * 100
+        return int(pence.to_integral_value(rounding=decimal.ROUND_HALF_UP))
+    return int(round(value * 100))
+
+
+def pence_to_pounds(pence):
+    """Convert integer pence to pounds, for display or json"""
+    return pence / 100
+
+
+def pence_to_str(pence):
+    """Format integer pence as an exact string of pounds, e.g. "-12.34\""""
+    return "{}{}.{:02d}".format("-" if pence < 0 else "", abs(pence) // 100, abs(pence) % 100)
@@ -0,0 +1,161 @@
+"""Module implementing the balance-chain ordering of bank transactions"""
+
+import collections
+import itertools
+
+__all__ = (
+    "TransactionOrderError",
+    "are_sequential",
+    "sort_transactions",
+)
+
+
+class TransactionOrderError(Exception):
+    """Error raised when transactions can't be stitched into a single chain"""
+
+    def __init__(self, reason, transactions, *, heads=(), unplaced=()):
+        self.reason = reason
+        self.transactions = transactions
+        self.heads = list(heads)
+        self.unplaced = list(unplaced)
+        super().__init__(self.report())
+
+    def report(self):
+        """Get a readable description of where the balance chain breaks"""
+        lines = ["Failed to sort {} transactions: {}".format(len(self.transactions),
+                                                            self.reason)]
+        for transaction in self.heads:
+            lines.append("  chain so far ends: {}".format(transaction))
+        for transaction in self.unplaced:
+            lines.append("  unplaced: {}".format(transaction))
+        return "\n".join(lines)
+
+
+def are_sequential(before, after):
+    """Check if the given transactions are sequential"""
+    return (before.ordinal <= after.ordinal
+            and before.balance_pence + after.amount_pence == after.balance_pence)
+
+
+def _day_starts(transactions):
+    """
+    Get the balances a day's transactions could be chained on from
+
+    A day whose transactions add up to a change in balance can only start on
+    one balance. A day whose transactions net to zero ends on the balance it
+    started on, so could start on the opening balance of any of them.
+    """
+    degree = collections.Counter()
+    for transaction in transactions:
+        degree[transaction.balance_pence - transaction.amount_pence] += 1
+        degree[transaction.balance_pence] -= 1
+
+    starts = [node for node, count in degree.items() if count > 0]
+    if starts:
+        return starts
+    return list(dict.fromkeys(transaction.balance_pence - transaction.amount_pence
+                              for transaction in transactions))
+
+
+def _stitch_day(transactions, balance):
+    """
+    Stitch the transactions from a single day into a chain
+
+    Returns the chain and the closing balance, or None if the transactions
+    can't be chained on from the given opening balance (None if unknown).
+    """
+    outgoing = collections.defaultdict(collections.deque)
+    degree = collections.Counter()
+    for transaction in transactions:
+        closing = transaction.balance_pence
+        opening = closing - transaction.amount_pence
+        outgoing[opening].append((closing, transaction))
+        degree[opening] += 1
+        degree[closing] -= 1
+
+    starts = [node for node, count in degree.items() if count > 0]
+    if len(starts) > 1 or (starts and degree[starts[0]] > 1):
+        return None
+    if starts:
+        start = starts[0]
+    elif balance is not None:
+        start = balance
+    else:
+        # The day ends on the balance it started on, so begin with the first
+        # transaction given
+        start = transactions[0].balance_pence - transactions[0].amount_pence
+    if balance is not None and start != balance:
+        return None
+
+    # Walk the chain, splicing in any loops back to an earlier balance
+    chain = []
+    stack = [(start, None)]
+    while stack:
+        node, transaction = stack[-1]
+        if outgoing[node]:
+            stack.append(outgoing[node].popleft())
+        else:
+            stack.pop()
+            if transaction is not None:
+                chain.append(transaction)
+    if len(chain) != len(transactions):
+        return None
+    chain.reverse()
+    return chain, chain[-1].balance_pence
+
+
+def sort_transactions(transactions):
+    """
+    Sort the list of transactions so they are in chronological order
+
+    Each transaction is an edge from its opening balance to its closing balance
+    so each day's transactions are a path through that day's edges, starting
+    where the previous day closed. Balances are indexed in hash maps and each
+    day is stitched in a single walk. When a balance has several outgoing
+    transactions (a balance seen more than once, or zero-amount rows) the one
+    given first is taken first so the result is deterministic.
+    """
+    if not transactions:
+        return transactions
+
+    # Stable sort, so ties keep the order the transactions were given in
+    by_date = sorted(transactions, key=lambda t: t.ordinal)
+    days = [list(day) for _, day in itertools.groupby(by_date, key=lambda t: t.ordinal)]
+
+    # If the first day nets to zero it could start on any of its balances, so
+    # try the one the first later day that can only start on one balance needs,
+    # then the rest
+    starts = _day_starts(days[0])
+    if len(starts) > 1:
+        for day in days[1:]:
+            needed = _day_starts(day)
+            if len(needed) == 1:
+                if needed[0] in starts:
+                    starts.remove(needed[0])
+                    starts.insert(0, needed[0])
+                break
+    else:
+        starts = [None]
+
+    for start in starts:
+        try:
+            return _stitch_days(days, start, transactions)
+        except TransactionOrderError as err:
+            error = err
+    raise error
+
+
+def _stitch_days(days, balance, transactions):
+    """Stitch each day on from the balance the previous day closed on"""
+    chain = []
+    for day in days:
+        stitched = _stitch_day(day, balance)
+        if stitched is None:
+            raise TransactionOrderError(
+                "balance chain is broken on {}".format(day[0].day),
+                transactions,
+                heads=chain[-1:],
+                unplaced=day)
+        day_chain, balance = stitched
+        chain.extend(day_chain)
+    return chain
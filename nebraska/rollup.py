@@ -0,0 +1,124 @@
+"""Module implementing monthly totals of bank accounts kept up to date as they change"""
+
+import datetime
+
+from .dates import parse_date
+
+__all__ = (
+    "Rollup",
+    "month_of",
+    "month_range",
+)
+
+
+def month_of(date):
+    """Get the month string (e.g. "2018-01") of a date object"""
+    return "{:04d}-{:02d}".format(date.year, date.month)
+
+
+def _month_bounds(month):
+    """Get the first and last dates of a month string"""
+    year, month = (int(part) for part in month.split("-"))
+    first = datetime.date(year, month, 1)
+    following = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return first, following - datetime.timedelta(days=1)
+
+
+def month_range(from_date=None, to_date=None):
+    """
+    Get the first and last months covered by the dates, as date objects or
+    strings, or None if the dates don't start and end on month boundaries
+    """
+    if isinstance(from_date, str):
+        from_date = parse_date(from_date)
+    if isinstance(to_date, str):
+        to_date = parse_date(to_date)
+
+    if from_date is not None and from_date.day != 1:
+        return None
+    if to_date is not None and to_date != _month_bounds(month_of(to_date))[1]:
+        return None
+    return (month_of(from_date) if from_date else None,
+            month_of(to_date) if to_date else None)
+
+
+class Rollup:
+    """
+    Income, spending and count of the transactions of each account by month
+    and category
+
+    The totals are built once from every transaction, then kept up to date as
+    transactions are added or have their category override changed, so
+    reports over whole months don't need to visit the transactions.
+    Categories are recorded by full name. Amounts are integer pence.
+    """
+
+    def __init__(self, revision=None):
+        # (account name, month, category name) -> [income, spending, count]
+        self.totals = {}
+        # The revision of the categories registry the totals were built with
+        self.revision = revision
+
+    @staticmethod
+    def build(accounts, categories):
+        """Total up every transaction of the accounts"""
+        ret = Rollup(categories.revision)
+        for account in accounts:
+            ret.add(account, account.get_transactions(), categories)
+        return ret
+
+    def _count(self, key, transaction, sign):
+        """Add (or with a sign of -1, remove) a transaction to the totals of key"""
+        row = self.totals.setdefault(key, [0, 0, 0])
+        row[1 if transaction.amount_pence < 0 else 0] += sign * transaction.amount_pence
+        row[2] += sign
+        if not row[2]:
+            del self.totals[key]
+
+    def add(self, account, transactions, categories):
+        """Add transactions which have been added to the account to the totals"""
+        for transaction in transactions:
+            category = transaction.get_category(categories)
+            self._count((account.name, month_of(transaction.day), category.get_name()),
+                        transaction, 1)
+
+    def move(self, account, transaction, old_category, new_category):
+        """Move a transaction between categories, e.g. when its override changes"""
+        month = month_of(transaction.day)
+        self._count((account.name, month, old_category.get_name()), transaction, -1)
+        self._count((account.name, month, new_category.get_name()), transaction, 1)
+
+    def get_totals(self, *, from_month=None, to_month=None, group_by=("category",)):
+        """
+        Get the income and spending between the months (inclusive), if given
+
+        Returns two dicts in the same form as aggregate.aggregate(), but with
+        categories given by full name.
+        """
+        parts = [{"account": 0, "month": 1, "category": 2}[name] for name in group_by]
+        income = {}
+        spending = {}
+        for key, (row_income, row_spending, _) in self.totals.items():
+            if ((from_month is not None and key[1] < from_month)
+                    or (to_month is not None and key[1] > to_month)):
+                continue
+            group = tuple(key[part] for part in parts)
+            if row_income or not row_spending:
+                income[group] = income.get(group, 0) + row_income
+            if row_spending:
+                spending[group] = spending.get(group, 0) + row_spending
+        return income, spending
+
+    def to_dict(self):
+        """Return a dict representing the totals"""
+        return {
+            "totals": [list(key) + row for key, row in self.totals.items()],
+        }
+
+    @staticmethod
+    def from_dict(rollup_dict, revision):
+        """Create a Rollup object from a dict definition"""
+        ret = Rollup(revision)
+        for account, month, category, income, spending, count in rollup_dict["totals"]:
+            ret.totals[(account, month, category)] = [income, spending, count]
+        return ret
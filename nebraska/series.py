@@ -0,0 +1,49 @@
+"""Module implementing balance time series over bank accounts"""
+
+from .dates import from_ordinal, to_ordinal
+from .money import pence_to_pounds
+
+__all__ = (
+    "daily_balances",
+)
+
+
+def daily_balances(accounts, *, from_date=None, to_date=None):
+    """
+    Get the balance at the end of each day for the given accounts
+
+    Returns the list of date strings and a dict of account name to the list
+    of balances on those dates, plus the sum of all accounts as "total".
+    The range, as date objects or strings, defaults to the first and last
+    transactions across all the accounts. Each account is swept once in date
+    order, carrying its balance forward over days without transactions; before
+    its first transaction an account holds that transaction's opening balance.
+    """
+    accounts = [(account.name, account.get_transactions()) for account in accounts]
+    accounts = [(name, transactions) for name, transactions in accounts if transactions]
+    if not accounts:
+        return [], {"total": []}
+
+    start = (min(transactions[0].ordinal for _, transactions in accounts)
+             if from_date is None else to_ordinal(from_date))
+    end = (max(transactions[-1].ordinal for _, transactions in accounts)
+           if to_date is None else to_ordinal(to_date))
+    days = range(start, end + 1)
+
+    balances = {}
+    for name, transactions in accounts:
+        series = []
+        balance = transactions[0].balance_pence - transactions[0].amount_pence
+        index = 0
+        for day in days:
+            while index < len(transactions) and transactions[index].ordinal <= day:
+                balance = transactions[index].balance_pence
+                index += 1
+            series.append(balance)
+        balances[name] = series
+
+    # Sum the totals in pence so they're exact, then convert to pounds
+    balances["total"] = [sum(day) for day in zip(*balances.values())]
+    for name, series in balances.items():
+        balances[name] = [pence_to_pounds(balance) for balance in series]
+    return [from_ordinal(day) for day in days], balances
@@ -3,29 +3,51 @@ Defines a nebraska Session
 """
 
 import datetime
+import hashlib
 import json
 import os
+import queue
+import threading
+import time
 from .common import (
     NEBRASKA_DIR,
-    CACHE_FILE,
     CATEGORIES_FILE,
-    CONFIG_FILE
+    CONFIG_FILE,
+    ROLLUP_FILE,
+    SYNC_FILE,
+    write_json_atomic
 )
-from .account import Account
-from .category import Category
+from . import banknodes
+from .aggregate import aggregate
+from .category import CategoryRegistry
+from .rollup import Rollup, month_range
+from .storage import get_store
 
 # Create the NEBRASKA_DIR is required
 if not os.path.exists(NEBRASKA_DIR):
     os.makedirs(NEBRASKA_DIR)
 
 
+def _jsonable(value):
+    """Get the value as it would be read back from json, e.g. tuples as lists"""
+    return json.loads(json.dumps(value))
+
+
 class Session:
     """A nebraska user session"""
 
     def __init__(self):
         self.accounts = []
         self.config = {}
-        self.categories = []
+        self.categories = CategoryRegistry()
+        self.store = None
+        # The categories as last loaded or saved, to skip saving them unchanged
+        self._saved_categories = None
+        # Node name -> {account name: date string} of the date each account
+        # has been downloaded up to
+        self.sync_marks = {}
+        # Monthly totals of the accounts, once they've been loaded or built
+        self._rollup = None
 
     def load(self, *, download=False):
         """Load the system data from the users nebraska dir"""
@@ -36,9 +58,31 @@ class Session:
         else:
             with open(CATEGORIES_FILE, "r") as jfile:
                 raw_categories = json.load(jfile)
-                for name in raw_categories:
-                    self.categories.append(Category.from_dict(name, raw_categories[name]))
+                self._saved_categories = json.dumps(raw_categories, sort_keys=True)
+        self.categories = CategoryRegistry.from_dict(raw_categories)
+
+        self.load_config()
+        self.store = get_store(self.config)
+        self.accounts = self.store.load(self.categories)
+
+        if os.path.exists(SYNC_FILE):
+            with open(SYNC_FILE, "r") as sync_file:
+                self.sync_marks = json.load(sync_file)
+
+        if os.path.exists(ROLLUP_FILE):
+            with open(ROLLUP_FILE, "r") as rollup_file:
+                raw_rollup = json.load(rollup_file)
+            # Only use the totals if they were saved with these categories
+            # and the cache hasn't been written to since
+            if (raw_rollup.get("digest") == self._categories_digest()
+                    and raw_rollup.get("stamp") == _jsonable(self.store.stamp())):
+                self._rollup = Rollup.from_dict(raw_rollup, self.categories.revision)
+
+        if download:
+            self.update()
 
+    def load_config(self):
+        """Load the config from the users nebraska dir"""
         self.config = {"keys": {}, "ids": {}}
         if not os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, "w") as config_file:
@@ -47,66 +91,192 @@ class Session:
             with open(CONFIG_FILE, "r") as config_file:
                 self.config = json.load(config_file)
 
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, "r") as infile:
-                self.accounts = json.load(infile)['accounts']
-                for index, account in enumerate(self.accounts):
-                    self.accounts[index] = Account.from_dict(account)
-
-        if download:
-            self.update()
-
     def save(self):
         """Save the system data to the users nebraska dir"""
-        with open(CACHE_FILE, "w") as outfile:
-            json.dump({"accounts": [account.to_dict() for account in self.accounts]},
-                      outfile,
-                      indent=4,
-                      sort_keys=True)
-            print("cache created")
-
-        with open(CATEGORIES_FILE, "w") as outfile:
-            output = dict()
-            for category in self.categories:
-                output[category.get_name()] = category.to_dict()
-            json.dump(output, outfile, indent=4, sort_keys=True)
+        if self.store is None:
+            self.store = get_store(self.config)
+        self.store.save(self.accounts)
+        print("cache created")
+
+        # Only record how far accounts are downloaded once they're in the cache
+        write_json_atomic(SYNC_FILE, self.sync_marks, indent=4, sort_keys=True)
+
+        output = self.categories.to_dict()
+        serialised = json.dumps(output, sort_keys=True)
+        if serialised != self._saved_categories:
+            write_json_atomic(CATEGORIES_FILE, output, indent=4, sort_keys=True)
+            self._saved_categories = serialised
             print("categories saved")
 
+        if self._rollup is not None and self._rollup.revision == self.categories.revision:
+            raw_rollup = self._rollup.to_dict()
+            raw_rollup["digest"] = self._categories_digest()
+            raw_rollup["stamp"] = _jsonable(self.store.stamp())
+            write_json_atomic(ROLLUP_FILE, raw_rollup)
+
+    def _categories_digest(self):
+        """Get a digest of the categories, to tell if they've changed since saving"""
+        serialised = json.dumps(self.categories.to_dict(), sort_keys=True)
+        return hashlib.sha1(serialised.encode("utf-8")).hexdigest()
+
+    def get_rollup(self):
+        """Get the monthly totals of the accounts, rebuilt if the categories have changed"""
+        if self._rollup is None or self._rollup.revision != self.categories.revision:
+            self._rollup = Rollup.build(self.accounts, self.categories)
+        return self._rollup
+
+    def get_category_totals(self, *, from_date=None, to_date=None):
+        """
+        Get the income and spending in pence by category between the dates,
+        as two dicts of category to total
+
+        Ranges of whole months are answered from the monthly totals, any
+        other range from the transactions.
+        """
+        months = month_range(from_date, to_date)
+        if months is not None:
+            from_month, to_month = months
+            income, spending = self.get_rollup().get_totals(from_month=from_month,
+                                                            to_month=to_month)
+            return ({self.categories.get_category(name): total
+                     for (name,), total in income.items()},
+                    {self.categories.get_category(name): total
+                     for (name,), total in spending.items()})
+
+        income, spending = aggregate(self.accounts, self.categories,
+                                     from_date=from_date, to_date=to_date)
+        return ({category: total for (category,), total in income.items()},
+                {category: total for (category,), total in spending.items()})
+
+    def set_category_override(self, account, transaction, category):
+        """Set the category override of a transaction in one of the accounts"""
+        old_category = transaction.get_category(self.categories)
+        transaction.set_category_override(category)
+        if self._rollup is not None:
+            self._rollup.move(account, transaction, old_category,
+                              transaction.get_category(self.categories))
+
     def update(self):
-        """Update the session by downloading the latest accounts from the web"""
-        fresh_accounts = download_all_transactions(self.config)
-        for fresh_acc in fresh_accounts:
-            for account in self.accounts:
-                if account.name == fresh_acc.name:
-                    account.update_from_fresh(fresh_acc)
-                    break
-            else:
-                self.accounts.append(fresh_acc)
+        """
+        Update the session by downloading the latest accounts from the web
+
+        Each node is only asked for the transactions since its accounts were
+        last downloaded, less an overlap ("sync_overlap_days" in the config)
+        to pick up transactions which appeared late. Returns a dict of account
+        name to the number of new transactions downloaded.
+        """
+        to_date = datetime.date.today()
+        overlap = datetime.timedelta(days=self.config.get("sync_overlap_days", 7))
+        from_dates = {}
+        for name, marks in self.sync_marks.items():
+            if marks:
+                synced = min(datetime.datetime.strptime(mark, "%Y-%m-%d").date()
+                             for mark in marks.values())
+                from_dates[name] = min(synced - overlap, to_date)
+
+        downloads = download_all_transactions(self.config, from_dates, to_date)
+        added = {}
+        for name, fresh_accounts in downloads.items():
+            for fresh_acc in fresh_accounts:
+                for account in self.accounts:
+                    if account.name == fresh_acc.name:
+                        report = account.update_from_fresh(fresh_acc)
+                        if self._rollup is not None:
+                            self._rollup.add(account, report.new, self.categories)
+                        added[account.name] = len(report.new)
+                        print("{}: {} new, {} duplicate, {} conflicting"
+                              "".format(account.name, len(report.new),
+                                        len(report.duplicate), len(report.conflicting)))
+                        break
+                else:
+                    self.accounts.append(fresh_acc)
+                    if self._rollup is not None:
+                        self._rollup.add(fresh_acc, fresh_acc.get_transactions(),
+                                         self.categories)
+                    added[fresh_acc.name] = len(fresh_acc.get_transactions())
+                    print("{}: {} new".format(fresh_acc.name, len(fresh_acc.get_transactions())))
+            self.sync_marks.setdefault(name, {}).update(
+                (fresh_acc.name, str(to_date)) for fresh_acc in fresh_accounts)
+        return added
 
     def create_category(self, name):
         """Create a new category with the given name"""
-        self.categories.append(Category(name))
+        self.categories.create(name)
 
 
 ###########################################################
 # DOWNLOAD TRANSACTIONS
 ###########################################################
-DOWNLOAD_METHODS = []
+DEFAULT_FROM_DATE = datetime.date(2018, 1, 1)
+
+
+def _download_node(name, config, from_date, to_date):
+    """Run the download method of a node, returning its accounts and run time"""
+    start = time.monotonic()
+    method = banknodes.load_download_method(name)
+    accounts = method(config, from_date, to_date)
+    return accounts, time.monotonic() - start
+
 
+def download_all_transactions(config, from_dates=None, to_date=None):
+    """
+    Load all the nodes and run their download methods concurrently
 
-def download_method(method):
-    """Descriptor for banknodes to register their download method"""
-    DOWNLOAD_METHODS.append(method)
+    Each node downloads from its date in from_dates (or from the start of 2018
+    if it has none) up to to_date (or today). Returns a dict of node name to
+    the list of accounts it downloaded. A node which fails or runs past its
+    timeout (from the "timeouts" config, in seconds) is skipped without losing
+    the accounts from the other nodes. Each node runs in a daemon thread, so
+    one which has timed out is abandoned and doesn't keep the process alive.
+    """
+    from_dates = from_dates or {}
+    to_date = to_date or datetime.date.today()
+    timeouts = config.get("timeouts", {})
 
+    results = queue.Queue()
 
-from .banknodes import *  # pylint: disable=wrong-import-position
+    def download_node(name):
+        """Run a node's download, putting its result or error on the queue"""
+        try:
+            results.put((name, _download_node(name, config,
+                                              from_dates.get(name, DEFAULT_FROM_DATE),
+                                              to_date), None))
+        except Exception as err:  # pylint: disable=broad-except
+            results.put((name, None, err))
 
+    start = time.monotonic()
+    for name in banknodes.__all__:
+        threading.Thread(target=download_node, args=(name,), daemon=True,
+                         name="download-" + name).start()
+
+    accounts = {}
+    timings = {}
+    deadlines = {name: start + timeouts[name] for name in banknodes.__all__ if name in timeouts}
+    pending = set(banknodes.__all__)
+    while pending:
+        waiting = [deadlines[name] for name in pending if name in deadlines]
+        try:
+            name, result, err = results.get(
+                timeout=None if not waiting else max(0, min(waiting) - time.monotonic()))
+        except queue.Empty:
+            for name in [name for name in pending
+                         if deadlines.get(name, float("inf")) <= time.monotonic()]:
+                print("{} timed out after {}s, skipping".format(name, timeouts[name]))
+                timings[name] = "timed out"
+                pending.remove(name)
+            continue
+
+        if name not in pending:
+            # Finished after its timeout, so already skipped
+            continue
+        pending.remove(name)
+        if err is not None:
+            print("{} failed, skipping: {!r}".format(name, err))
+            timings[name] = "failed"
+        else:
+            accounts[name], elapsed = result
+            timings[name] = "{:.1f}s".format(elapsed)
 
-def download_all_transactions(config):
-    """Load all the nodes and run their download methods"""
-    accounts = []
-    for method in DOWNLOAD_METHODS:
-        accounts.extend(method(config,
-                               datetime.date(2018, 1, 1),
-                               datetime.date.today()))
+    print("Downloads: {}".format(", ".join("{} {}".format(name, timings[name])
+                                          for name in banknodes.__all__)))
     return accounts
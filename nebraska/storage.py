@@ -0,0 +1,492 @@
+"""
+Stores holding the accounts of a nebraska session between runs
+"""
+
+import collections
+import functools
+import json
+import os
+import sqlite3
+
+from .account import Account
+from .common import CACHE_FILE, DATABASE_FILE, JOURNAL_FILE, open_atomic
+from .transaction import Transaction
+
+__all__ = (
+    "JournalStore",
+    "JsonStore",
+    "SqliteStore",
+    "get_store",
+)
+
+
+def _override_name(transaction):
+    """Get the name of the category override of a transaction, if any"""
+    override = transaction.get_category_override()
+    return override.get_name() if override else None
+
+
+def _keyed(transactions):
+    """
+    Yield each transaction with a key unique within its account
+
+    Identical transactions (e.g. two equal transfers on the same day) share a
+    fingerprint so are told apart by the order they occur in.
+    """
+    occurrences = collections.Counter()
+    for transaction in transactions:
+        fingerprint = transaction.fingerprint()
+        yield (fingerprint, occurrences[fingerprint]), transaction
+        occurrences[fingerprint] += 1
+
+
+_ACCOUNTS_START = '"accounts":['
+_TRANSACTIONS_START = ',"transactions":['
+
+
+def _compact_json(data):
+    """Serialise the data to json without any whitespace"""
+    return json.dumps(data, separators=(",", ":"), sort_keys=True)
+
+
+def _write_snapshot(path, accounts, **header):
+    """
+    Write the accounts to a json file with one transaction per line, so the
+    file can be read back a line at a time by _read_snapshot
+    """
+    with open_atomic(path) as outfile:
+        outfile.write(_compact_json(header)[:-1] + ("," if header else "")
+                      + _ACCOUNTS_START + "\n")
+        for index, account in enumerate(accounts):
+            outfile.write(_compact_json({"name": account.name})[:-1] + _TRANSACTIONS_START + "\n")
+            transactions = account.get_transactions()
+            for t_index, transaction in enumerate(transactions):
+                outfile.write(_compact_json(transaction.to_dict())
+                              + ("," if t_index < len(transactions) - 1 else "") + "\n")
+            outfile.write("]}" + ("," if index < len(accounts) - 1 else "") + "\n")
+        outfile.write("]}\n")
+
+
+def _read_snapshot(path, categories):
+    """
+    Read a json file of accounts, returning the other top level entries of the
+    file and the list of accounts. Category overrides are resolved through the
+    categories registry
+
+    Files written by _write_snapshot are parsed a line at a time, creating the
+    transactions as they're read so the whole json tree is never in memory.
+    Any other json file is read in one go.
+    """
+    with open(path, "r") as infile:
+        first = infile.readline().rstrip("\n")
+        if not first.endswith(_ACCOUNTS_START):
+            infile.seek(0)
+            snapshot = json.load(infile)
+            accounts = [Account.from_dict(account, categories)
+                        for account in snapshot.pop("accounts")]
+            return snapshot, accounts
+
+        header = json.loads(first[:-len(_ACCOUNTS_START)].rstrip(",") + "}")
+        accounts = []
+        for line in infile:
+            line = line.rstrip("\n")
+            if line.endswith(_TRANSACTIONS_START):
+                accounts.append(Account(json.loads(line[:-len(_TRANSACTIONS_START)] + "}")["name"]))
+            elif not line.startswith("]"):
+                accounts[-1].add_transaction(Transaction.from_dict(json.loads(line.rstrip(",")),
+                                                              categories))
+        return header, accounts
+
+
+class _Store:
+    """
+    Base for the stores, remembering what has been loaded and saved so only
+    the changes need writing
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Account name -> {transaction key: category override name}
+        self._saved = {}
+
+    @classmethod
+    def from_config(cls, config):  # pylint: disable=unused-argument
+        """Create the store with any options given in the config"""
+        return cls()
+
+    def exists(self):
+        """Check if the store has been created"""
+        return os.path.exists(self.path)
+
+    def stamp(self):
+        """Get a stamp which changes whenever the store is written to"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _remember(self, account):
+        """Record all the transactions of an account as held in the store"""
+        self._saved[account.name] = {key: _override_name(transaction)
+                                     for key, transaction in _keyed(account.get_transactions())}
+
+    def _changes(self, account):
+        """
+        Get the transactions of an account added or with their category
+        override changed since the store was last loaded or saved
+
+        Returns a list of (key, transaction, is_new) tuples.
+        """
+        saved = self._saved.get(account.name, {})
+        changes = []
+        for key, transaction in _keyed(account.get_transactions()):
+            if key not in saved:
+                changes.append((key, transaction, True))
+            elif saved[key] != _override_name(transaction):
+                changes.append((key, transaction, False))
+        return changes
+
+    def _mark_saved(self, name, changes):
+        """Record the changes of an account as written to the store"""
+        saved = self._saved.setdefault(name, {})
+        for key, transaction, _ in changes:
+            saved[key] = _override_name(transaction)
+
+
+class JsonStore(_Store):
+    """Store keeping every account in a single json file"""
+
+    def __init__(self, path=CACHE_FILE):
+        super().__init__(path)
+
+    def load(self, categories):
+        """Load the list of accounts from the store"""
+        if not self.exists():
+            return []
+        _, accounts = _read_snapshot(self.path, categories)
+        return accounts
+
+    def save(self, accounts):
+        """Save the list of accounts to the store"""
+        _write_snapshot(self.path, accounts)
+
+
+class JournalStore(JsonStore):
+    """
+    Store keeping a json snapshot of every account plus an append-only journal
+    of the changes made since the snapshot was written
+
+    Saving appends only the new transactions and category override changes to
+    the journal. Once the journal has grown past compact_after entries it is
+    compacted: a new snapshot is written and the journal discarded. The
+    snapshot and the first line of the journal hold a generation number so a
+    journal left behind by an interrupted compaction is ignored on load.
+    """
+
+    def __init__(self, path=CACHE_FILE, journal_path=JOURNAL_FILE, *, compact_after=1000):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.compact_after = compact_after
+        self._generation = 0
+        self._entries = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Create the store with any options given in the config"""
+        if "journal_compact_after" in config:
+            return cls(compact_after=config["journal_compact_after"])
+        return cls()
+
+    def stamp(self):
+        """Get a stamp which changes whenever the store is written to"""
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return super().stamp()
+        return (super().stamp(), stat.st_mtime_ns, stat.st_size)
+
+    def load(self, categories):
+        """Load the list of accounts from the snapshot and replay the journal"""
+        accounts = []
+        if self.exists():
+            header, accounts = _read_snapshot(self.path, categories)
+            self._generation = header.get("generation", 0)
+
+        self._replay(accounts, categories)
+        for account in accounts:
+            self._remember(account)
+        return accounts
+
+    def _replay(self, accounts, categories):
+        """Apply the changes recorded in the journal to the list of accounts"""
+        self._entries = 0
+        if not os.path.exists(self.journal_path):
+            return
+
+        by_name = {account.name: account for account in accounts}
+        # Account name -> {transaction key: transaction}, built when needed
+        indexes = {}
+        with open(self.journal_path, "r") as journal:
+            try:
+                header = json.loads(journal.readline())
+            except ValueError:
+                header = None
+            stale = not header or header.get("generation") != self._generation
+        if stale:
+            # Left behind by an interrupted compaction, so already in the snapshot
+            print("Removing out of date journal {}".format(self.journal_path))
+            os.remove(self.journal_path)
+            return
+
+        with open(self.journal_path, "r") as journal:
+            journal.readline()
+
+            complete = journal.tell()
+            for line in iter(journal.readline, ""):
+                try:
+                    entry = json.loads(line) if line.endswith("\n") else None
+                except ValueError:
+                    entry = None
+                if entry is None:
+                    # Only the last entry can be incomplete, if a save was
+                    # interrupted, so drop it before anything is appended
+                    print("Ignoring incomplete journal entry")
+                    journal.close()
+                    os.truncate(self.journal_path, complete)
+                    break
+                complete = journal.tell()
+                self._entries += 1
+
+                name = entry["account"]
+                if name not in by_name:
+                    by_name[name] = Account(name)
+                    accounts.append(by_name[name])
+                account = by_name[name]
+
+                if entry["op"] == "add":
+                    account.add_transaction(Transaction.from_dict(entry["transaction"], categories))
+                    indexes.pop(name, None)
+                elif entry["op"] == "override":
+                    if name not in indexes:
+                        indexes[name] = dict(_keyed(account.get_transactions()))
+                    transaction = indexes[name].get((entry["fingerprint"], entry["occurrence"]))
+                    if transaction is None:
+                        print("Journal override for unknown transaction in {}".format(name))
+                        continue
+                    transaction.set_category_override(categories.get_category(entry["category"])
+                                                      if entry["category"] else None)
+
+    def save(self, accounts):
+        """Append the changes to the list of accounts to the journal"""
+        if not self.exists():
+            self.compact(accounts)
+            return
+
+        entries = []
+        changes = {}
+        for account in accounts:
+            if account.name not in self._saved:
+                entries.append({"op": "account", "account": account.name})
+            changes[account.name] = self._changes(account)
+            for (fingerprint, occurrence), transaction, is_new in changes[account.name]:
+                if is_new:
+                    entries.append({"op": "add",
+                                    "account": account.name,
+                                    "transaction": transaction.to_dict()})
+                else:
+                    entries.append({"op": "override",
+                                    "account": account.name,
+                                    "fingerprint": fingerprint,
+                                    "occurrence": occurrence,
+                                    "category": _override_name(transaction)})
+
+        if not entries:
+            return
+        if self._entries + len(entries) > self.compact_after:
+            self.compact(accounts)
+            return
+
+        new_journal = not os.path.exists(self.journal_path)
+        with open(self.journal_path, "a") as journal:
+            if new_journal:
+                journal.write(json.dumps({"generation": self._generation}) + "\n")
+            for entry in entries:
+                journal.write(json.dumps(entry, sort_keys=True) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        self._entries += len(entries)
+        for name, account_changes in changes.items():
+            self._mark_saved(name, account_changes)
+
+    def compact(self, accounts):
+        """Write a new snapshot of all the accounts and discard the journal"""
+        self._generation += 1
+        _write_snapshot(self.path, accounts, generation=self._generation)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+        self._entries = 0
+        for account in accounts:
+            self._remember(account)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    account TEXT NOT NULL REFERENCES accounts (name),
+    fingerprint TEXT NOT NULL,
+    occurrence INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    balance_after INTEGER NOT NULL,
+    counterparty TEXT,
+    category_override TEXT,
+    PRIMARY KEY (account, fingerprint, occurrence)
+);
+CREATE INDEX IF NOT EXISTS transactions_by_date ON transactions (account, date);
+CREATE INDEX IF NOT EXISTS transactions_by_fingerprint ON transactions (fingerprint);
+"""
+# Version of the schema, recorded in the database's user_version
+_SCHEMA_VERSION = 1
+
+
+class SqliteStore(_Store):
+    """
+    Store keeping the accounts in an SQLite database
+
+    The transactions of each account are only read from the database when the
+    account is first used, and saving only writes the transactions which are
+    new or have had their category override changed.
+    """
+
+    def __init__(self, path=DATABASE_FILE, json_path=CACHE_FILE):
+        super().__init__(path)
+        # The json cache copied into the database when it's first created
+        self.json_path = json_path
+        self._connection = None
+
+    def _connect(self):
+        """Get the connection to the database, creating the tables if needed"""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            self._upgrade(self._connection)
+        return self._connection
+
+    def _upgrade(self, connection):
+        """
+        Create the tables, or upgrade a database written by an older version
+        of the schema
+
+        Nothing is written if the database is already up to date, so opening
+        it doesn't change the store's stamp. Each upgrade runs as a single
+        transaction so an interrupted upgrade is rolled back.
+        """
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version >= _SCHEMA_VERSION:
+            return
+
+        exists = connection.execute("SELECT 1 FROM sqlite_master"
+                                    " WHERE type = 'table' AND name = 'transactions'").fetchone()
+        script = ["BEGIN;"]
+        if exists:
+            # Amounts and balances were stored as pounds, convert them to pence
+            print("Upgrading {} to integer pence".format(self.path))
+            script.append("""
+                DROP INDEX IF EXISTS transactions_by_date;
+                DROP INDEX IF EXISTS transactions_by_fingerprint;
+                ALTER TABLE transactions RENAME TO transactions_old;
+            """)
+        script.append(_SCHEMA)
+        if exists:
+            script.append("""
+                INSERT INTO transactions SELECT account, fingerprint, occurrence, date,
+                    description, CAST(ROUND(amount * 100) AS INTEGER),
+                    CAST(ROUND(balance_after * 100) AS INTEGER), counterparty,
+                    category_override FROM transactions_old ORDER BY rowid;
+                DROP TABLE transactions_old;
+            """)
+        script.append("PRAGMA user_version = {};".format(_SCHEMA_VERSION))
+        script.append("COMMIT;")
+        connection.executescript("\n".join(script))
+
+    def load(self, categories):
+        """Load the list of accounts from the store"""
+        if not self.exists() and os.path.exists(self.json_path):
+            self.migrate_from(JsonStore(self.json_path), categories)
+
+        return [Account(name, loader=functools.partial(self._load_transactions, name, categories))
+                for (name,) in self._connect().execute(
+                    "SELECT name FROM accounts ORDER BY rowid")]
+
+    def _load_transactions(self, name, categories):
+        """Load the transactions of an account from the database"""
+        saved = self._saved.setdefault(name, {})
+        transactions = []
+        for row in self._connect().execute(
+                "SELECT fingerprint, occurrence, date, description, amount, balance_after,"
+                " counterparty, category_override"
+                " FROM transactions WHERE account = ? ORDER BY date, rowid", (name,)):
+            (fingerprint, occurrence, date, description, amount, balance,
+             counterparty, override) = row
+            transactions.append(Transaction(date, description, amount, balance,
+                                            counterparty=counterparty,
+                                            category_override=(categories.get_category(override)
+                                                               if override else None)))
+            saved[(fingerprint, occurrence)] = override
+        return transactions
+
+    def save(self, accounts):
+        """Save the changes to the list of accounts to the store"""
+        connection = self._connect()
+        changes = {}
+        with connection:
+            for account in accounts:
+                connection.execute("INSERT OR IGNORE INTO accounts (name) VALUES (?)",
+                                   (account.name,))
+                if not account.is_loaded():
+                    # Nothing can have changed if the account was never used
+                    continue
+
+                changes[account.name] = self._changes(account)
+                for (fingerprint, occurrence), transaction, is_new in changes[account.name]:
+                    if is_new:
+                        connection.execute(
+                            "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (account.name, fingerprint, occurrence, transaction.date,
+                             transaction.description, transaction.amount_pence,
+                             transaction.balance_pence, transaction.counterparty,
+                             _override_name(transaction)))
+                    else:
+                        connection.execute(
+                            "UPDATE transactions SET category_override = ?"
+                            " WHERE account = ? AND fingerprint = ? AND occurrence = ?",
+                            (_override_name(transaction), account.name, fingerprint, occurrence))
+
+        for name, account_changes in changes.items():
+            self._mark_saved(name, account_changes)
+
+    def migrate_from(self, store, categories):
+        """Copy all the accounts from another store into this one"""
+        print("Migrating {} to {}".format(store.path, self.path))
+        self.save(store.load(categories))
+
+
+STORES = {
+    "journal": JournalStore,
+    "json": JsonStore,
+    "sqlite": SqliteStore,
+}
+
+
+def get_store(config):
+    """Create the store selected in the config"""
+    storage = config.get("storage", "json")
+    if storage not in STORES:
+        print("Unknown storage {}, using json. See README for help.".format(storage))
+        storage = "json"
+    return STORES[storage].from_config(config)
@@ -1,19 +1,53 @@
 """Module implementing features of a bank transaction"""
 
+import hashlib
+
 from .category import Category
+from .dates import parse_date
+from .money import pence_to_pounds, pence_to_str, to_pence
 
 
 class Transaction:
-    """Class representing a bank transaction"""
-
-    def __init__(self, date, description, amount, balance_after, *,
+    """
+    Class representing a bank transaction
+
+    The amount and balance after the transaction are held in integer pence.
+    The date string is parsed once, into the day and its ordinal, for
+    comparing and bucketing transactions by date.
+    """
+    __slots__ = (
+        "date",
+        "day",
+        "ordinal",
+        "description",
+        "amount_pence",
+        "balance_pence",
+        "counterparty",
+        "_category_override",
+        "_fingerprint",
+    )
+
+    def __init__(self, date, description, amount_pence, balance_pence, *,
                  counterparty=None, category_override=None):
         self.date = date
+        self.day = parse_date(date)
+        self.ordinal = self.day.toordinal()
         self.description = description
-        self.amount = amount
-        self.balance_after = balance_after
+        self.amount_pence = amount_pence
+        self.balance_pence = balance_pence
         self.counterparty = counterparty
         self._category_override = category_override
+        self._fingerprint = None
+
+    @property
+    def amount(self):
+        """The amount of the transaction in pounds"""
+        return pence_to_pounds(self.amount_pence)
+
+    @property
+    def balance_after(self):
+        """The balance after the transaction in pounds"""
+        return pence_to_pounds(self.balance_pence)
 
     def __repr__(self):
         return self.__str__()
@@ -21,8 +55,8 @@ class Transaction:
     def __str__(self):
         return ("| {:10} | {:>9} | {:30} | {:20} | {:15} |"
                 "".format(self.date[:10],
-                          " £{:.2f}".format(self.amount) if self.amount >= 0
-                          else "-£{:.2f}".format(-self.amount),
+                          " £" + pence_to_str(self.amount_pence) if self.amount_pence >= 0
+                          else "-£" + pence_to_str(-self.amount_pence),
                           self.description[:30],
                           self.counterparty[:20] if self.counterparty else "",
                           self._category_override.get_name()[:15] if self._category_override else ""))
@@ -31,10 +65,29 @@ class Transaction:
         return (self.__class__ == other.__class__
                 and self.date == other.date
                 and self.description == other.description
-                and self.amount == other.amount
-                and self.balance_after == other.balance_after
+                and self.amount_pence == other.amount_pence
+                and self.balance_pence == other.balance_pence
                 and self.counterparty == other.counterparty)
 
+    def __hash__(self):
+        return hash(self.fingerprint())
+
+    def fingerprint(self):
+        """
+        Return a stable fingerprint of the content of this transaction
+
+        The fingerprint is the same across runs so can be stored alongside the
+        transaction to recognise it again.
+        """
+        if self._fingerprint is None:
+            content = "\x1f".join([self.date,
+                                    self.description,
+                                    pence_to_str(self.amount_pence),
+                                    pence_to_str(self.balance_pence),
+                                    self.counterparty or ""])
+            self._fingerprint = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        return self._fingerprint
+
     def get_category(self, categories):
         """Return the category of this transaction"""
         return (self._category_override
@@ -43,6 +96,10 @@ class Transaction:
                                                description=self.description,
                                                counterparty=self.counterparty))
 
+    def get_category_override(self):
+        """Return the category override for this transaction, if any"""
+        return self._category_override
+
     def set_category_override(self, override):
         """Set the category override for this transaction"""
         self._category_override = override
@@ -61,44 +118,16 @@ class Transaction:
         return ret
 
     @staticmethod
-    def from_dict(transaction_dict):
-        """Create a Transaction object from a dict definition"""
+    def from_dict(transaction_dict, categories):
+        """
+        Create a Transaction object from a dict definition, resolving any
+        category override through the categories registry
+        """
         return Transaction(transaction_dict["date"],
                            transaction_dict["description"],
-                           transaction_dict["amount"],
-                           transaction_dict["balance_after"],
+                           to_pence(transaction_dict["amount"]),
+                           to_pence(transaction_dict["balance_after"]),
                            counterparty=transaction_dict["counterparty"],
-                           category_override=(Category.get_category(transaction_dict["category_override"])
-                                              if "category_override" in transaction_dict
-                                              else None))
-
-def sort_transactions(transactions):
-    """Sort the list of transactions so they are in chronological order"""
-
-    if not transactions:
-        return transactions
-
-    def are_sequential(before, after):
-        """Check if the given transactions are sequential"""
-        return (before.date <= after.date
-                and ("{:.2f}".format(before.balance_after + after.amount)
-                     == "{:.2f}".format(after.balance_after)))
-
-    sorted_t = [transactions[0]]
-    unsorted_t = transactions[1:]
-    while unsorted_t:
-        insert_index = None
-        for index, transaction in enumerate(unsorted_t):
-            if are_sequential(transaction, sorted_t[0]):
-                sorted_t.insert(0, transaction)
-                insert_index = index
-                break
-            elif are_sequential(sorted_t[-1], transaction):
-                sorted_t.append(transaction)
-                insert_index = index
-                break
-        else:
-            raise Exception("Failed to sort transactions: " + str(transactions))
-        del unsorted_t[insert_index]
-
-    return sorted_t
+                           category_override=(
+                               categories.get_category(transaction_dict["category_override"])
+                               if "category_override" in transaction_dict else None))
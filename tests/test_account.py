@@ -0,0 +1,79 @@
+"""
+Tests for bank accounts
+"""
+import unittest
+
+from nebraska.account import Account
+from nebraska.transaction import Transaction
+
+
+def make_existing():
+    """Make an account holding two identical transfers out"""
+    return Account("current", [
+        Transaction("2020-01-01", "SALARY", 100000, 150000),
+        Transaction("2020-01-02", "SHOP", -1000, 149000),
+        Transaction("2020-01-03", "TRANSFER", -500, 148500),
+        Transaction("2020-01-03", "TRANSFER", 500, 149000),
+        Transaction("2020-01-03", "TRANSFER", -500, 148500),
+    ])
+
+
+def summary(transactions):
+    """Get the description, amount and balance of each transaction"""
+    return [(transaction.description, transaction.amount_pence, transaction.balance_pence)
+            for transaction in transactions]
+
+
+class UpdateFromFreshTest(unittest.TestCase):
+    """Tests for merging freshly downloaded transactions into an account"""
+
+    def test_repeated_transactions(self):
+        """Identical transactions are matched one for one, so extra repeats are new"""
+        account = make_existing()
+        report = account.update_from_fresh(Account("current", [
+            Transaction("2020-01-02", "SHOP", -1000, 149000),
+            Transaction("2020-01-03", "TRANSFER", -500, 148500),
+            Transaction("2020-01-03", "TRANSFER", 500, 149000),
+            Transaction("2020-01-03", "TRANSFER", -500, 148500),
+            Transaction("2020-01-03", "TRANSFER", 500, 149000),
+            Transaction("2020-01-03", "TRANSFER", -500, 148500),
+            Transaction("2020-01-04", "TESCO", -200, 148300),
+        ]))
+
+        self.assertEqual(summary(report.new), [("TRANSFER", 500, 149000),
+                                               ("TRANSFER", -500, 148500),
+                                               ("TESCO", -200, 148300)])
+        self.assertEqual(len(report.duplicate), 4)
+        self.assertEqual(report.conflicting, [])
+        self.assertEqual(summary(account.get_transactions()),
+                         [("SALARY", 100000, 150000), ("SHOP", -1000, 149000)]
+                         + [("TRANSFER", -500, 148500), ("TRANSFER", 500, 149000)] * 2
+                         + [("TRANSFER", -500, 148500), ("TESCO", -200, 148300)])
+
+    def test_fewer_repeats(self):
+        """Fewer repeats of an identical transaction than held are all duplicates"""
+        account = make_existing()
+        report = account.update_from_fresh(Account("current", [
+            Transaction("2020-01-03", "TRANSFER", -500, 148500),
+        ]))
+        self.assertEqual((len(report.new), len(report.duplicate), len(report.conflicting)),
+                         (0, 1, 0))
+        self.assertEqual(summary(account.get_transactions()),
+                         summary(make_existing().get_transactions()))
+
+    def test_changed_description(self):
+        """A transaction in the same place with a new description conflicts and isn't added"""
+        account = make_existing()
+        report = account.update_from_fresh(Account("current", [
+            Transaction("2020-01-02", "SHOP LTD", -1000, 149000),
+            Transaction("2020-01-03", "TRANSFER", -500, 148500),
+        ]))
+        self.assertEqual(report.new, [])
+        self.assertEqual(summary(report.duplicate), [("TRANSFER", -500, 148500)])
+        self.assertEqual(summary(report.conflicting), [("SHOP LTD", -1000, 149000)])
+        self.assertEqual(summary(account.get_transactions()),
+                         summary(make_existing().get_transactions()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests that the analytics reports agree with the aggregate and series modules
+"""
+import datetime
+import random
+import unittest
+from unittest import mock
+
+from nebraska import analytics
+from nebraska.account import Account
+from nebraska.aggregate import aggregate
+from nebraska.category import CategoryRegistry
+from nebraska.series import daily_balances
+from nebraska.transaction import Transaction
+
+DESCRIPTIONS = ["TESCO", "SALARY", "RENT", "AMAZON", "UNKNOWN SHOP"]
+RANGES = [(None, None), ("2020-02-01", "2020-05-10"), (None, "2020-03-01"),
+          ("2020-04-04", None), ("2019-12-25", "2020-01-05")]
+
+
+def make_account(name, count, rand, categories):
+    """Make an account with a random history, some with category overrides"""
+    day = datetime.date(2020, 1, 1)
+    balance = rand.randint(0, 100000)
+    transactions = []
+    for _ in range(count):
+        day += datetime.timedelta(days=rand.randint(0, 2))
+        amount = rand.choice([0, rand.randint(-5000, 5000)])
+        balance += amount
+        transactions.append(Transaction(day.isoformat(), rand.choice(DESCRIPTIONS), amount,
+                                        balance, counterparty=rand.choice([None, "AMAZON"])))
+        if rand.random() < 0.1:
+            transactions[-1].set_category_override(categories.get_category("Bills"))
+    return Account(name, transactions)
+
+
+class AnalyticsTest(unittest.TestCase):
+    """The NumPy and pure Python reports match aggregate() and daily_balances()"""
+
+    def setUp(self):
+        self.categories = CategoryRegistry()
+        for name, description in [("Food", "TESCO"), ("Income", "SALARY"),
+                                  ("Bills", "RENT"), ("Shopping", "AMAZON")]:
+            self.categories.create(name).add_description(description)
+        rand = random.Random(1)
+        self.accounts = [make_account("current", 300, rand, self.categories),
+                         make_account("savings", 40, rand, self.categories),
+                         Account("empty")]
+
+    def check_reports(self):
+        """Check the reports of every range against the other modules"""
+        reports = analytics.Analytics(self.accounts, self.categories)
+        for from_date, to_date in RANGES:
+            income, spending = aggregate(self.accounts, self.categories,
+                                         from_date=from_date, to_date=to_date)
+            income = {key[0]: total for key, total in income.items()}
+            spending = {key[0]: total for key, total in spending.items()}
+            self.assertEqual(reports.category_totals(from_date=from_date, to_date=to_date),
+                             (income, spending))
+            self.assertEqual(reports.net(from_date=from_date, to_date=to_date),
+                             (sum(income.values()), sum(spending.values())))
+            self.assertEqual(reports.daily_balances(from_date=from_date, to_date=to_date),
+                             daily_balances(self.accounts, from_date=from_date, to_date=to_date))
+
+    @unittest.skipIf(analytics.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        """The vectorised reports match"""
+        self.check_reports()
+
+    def test_python(self):
+        """The pure Python reports match"""
+        with mock.patch.object(analytics, "numpy", None):
+            self.check_reports()
+
+    def test_no_transactions(self):
+        """Accounts without transactions give empty reports"""
+        reports = analytics.Analytics([Account("empty")], self.categories)
+        self.assertEqual(reports.net(), (0, 0))
+        self.assertEqual(reports.category_totals(), ({}, {}))
+        self.assertEqual(reports.daily_balances(), ([], {"total": []}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Tests for categories and the category registry
+"""
+import unittest
+
+from nebraska.category import CategoryRegistry, UNKNOWN
+
+
+class CategoryRegistryTest(unittest.TestCase):
+    """Tests for CategoryRegistry"""
+
+    def test_round_trip(self):
+        """Saving and loading the categories gives back the same dict"""
+        registry = CategoryRegistry()
+        food = registry.create("Food")
+        food.add_description("TESCO")
+        food.create_child("Fast")
+        saved = registry.to_dict()
+
+        loaded = CategoryRegistry.from_dict(saved)
+        self.assertEqual(loaded.to_dict(), saved)
+        self.assertEqual(saved["Food"]["children"], {"Fast": {}})
+        self.assertEqual(loaded.get_category("Food--Fast").get_name(), "Food--Fast")
+
+    def test_legacy_child_names(self):
+        """Children saved under their full names are loaded with their own names"""
+        registry = CategoryRegistry.from_dict(
+            {"Food": {"children": {"Food--Food--Fast": {},
+                                   "Food--Treats": {"children": {"Food--Treats--Cake": {}}}}}})
+        self.assertEqual(registry.to_dict(),
+                         {"Food": {"children": {"Fast": {}, "Treats": {"children": {"Cake": {}}}}}})
+        # Overrides saved with the nested names still resolve
+        self.assertIs(registry.get_category("Food--Food--Fast"),
+                      registry.get_category("Food--Fast"))
+        self.assertIs(registry.get_category("Food--Food--Treats--Food--Treats--Cake"),
+                      registry.get_category("Food--Treats--Cake"))
+
+    def test_unknown(self):
+        """Unknown resolves to the shared UNKNOWN category"""
+        self.assertIs(CategoryRegistry().get_category("Unknown"), UNKNOWN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Tests for the Lloyds statement exports, against a fake Lloyds website
+"""
+import contextlib
+import datetime
+import http.cookies
+import http.server
+import io
+import os
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from unittest import mock
+
+try:
+    from nebraska.banknodes import lloyds
+except ImportError:
+    lloyds = None
+
+ACCOUNTS = ["Current", "Savings"]
+
+PAGE = "<html><head><title>{}</title></head><body>{}</body></html>"
+LOGIN = PAGE.format("Log on", """
+<form id="frmLogin" method="post" action="/login">
+  <input name="frmLogin:strCustomerLogin_userID">
+  <input name="frmLogin:strCustomerLogin_pwd">
+</form>""")
+MEMORABLE = PAGE.format("Enter Memorable Information", """
+<form id="frmentermemorableinformation1" method="post" action="/memorable">
+  {}
+</form>""".format("".join(
+    """<label for="frmentermemorableinformation1:strEnterMemorableInformation_memInfo{0}">
+    Character {0}</label>
+    <input name="frmentermemorableinformation1:strEnterMemorableInformation_memInfo{0}">
+    """.format(index) for index in range(1, 4))))
+HOME = PAGE.format("Your accounts", "".join(
+    '<a href="/statement?account={0}" data-wt-ac="{0} resource">View statement</a>'.format(name)
+    for name in ACCOUNTS))
+STATEMENT = PAGE.format("Statement {}",
+                        '<a id="lnkExportStatementSSR" href="/export">Export</a>')
+EXPORT = PAGE.format("Export", """
+<form id="export-statement-form" method="post" action="/export">
+  <input name="exportDateRange">
+  <input name="searchDateFrom">
+  <input name="searchDateTo">
+  <input name="export-format">
+</form>""")
+CSV_HEADER = ("Transaction Date,Transaction Type,Sort Code,Account Number,"
+              "Transaction Description,Debit Amount,Credit Amount,Balance\n")
+
+
+class FakeLloydsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the pages of the fake site. Like the real site, it tracks the
+    account of the last statement opened, and it issues a new session token
+    with each statement which the exports must send.
+    """
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/login":
+            self._send(LOGIN)
+        elif url.path == "/statement" and self._logged_in():
+            with self.server.lock:
+                self.server.selected = dict(urllib.parse.parse_qsl(url.query))["account"]
+                self.server.token += 1
+                token = self.server.token
+            self._send(STATEMENT.format(self.server.selected), token=token)
+        elif url.path == "/export" and self._logged_in():
+            self._send(EXPORT)
+        else:
+            self._send(PAGE.format("Error", ""), status=403)
+
+    def do_POST(self):
+        form = dict(urllib.parse.parse_qsl(
+            self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")))
+        if self.path == "/login":
+            self._send(MEMORABLE, token=self.server.token)
+        elif self.path == "/memorable" and self._logged_in():
+            self._send(HOME)
+        elif self.path == "/export" and self._logged_in():
+            with self.server.lock:
+                account = self.server.selected
+                self.server.exports.append((account, form["searchDateFrom"]))
+            self._send(CSV_HEADER + "{},DEB,'00-00-00,1234,{} {},1.00,,99.00\n"
+                       "".format(form["searchDateFrom"], account, form["searchDateFrom"]),
+                       content_type="application/csv",
+                       disposition="attachment; filename={}.csv".format(account))
+        else:
+            self._send(PAGE.format("Error", ""), status=403)
+
+    def _logged_in(self):
+        cookies = http.cookies.SimpleCookie(self.headers.get("Cookie", ""))
+        return "token" in cookies and cookies["token"].value == str(self.server.token)
+
+    def _send(self, body, status=200, token=None, content_type="text/html",
+              disposition=None):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if token is not None:
+            self.send_header("Set-Cookie", "token={}; Path=/".format(token))
+        if disposition is not None:
+            self.send_header("Content-Disposition", disposition)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *_):
+        pass
+
+
+class FakeLloydsServer(http.server.ThreadingHTTPServer):
+    """A local Lloyds website in a thread, keeping the (account, from date) of every export"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeLloydsHandler)
+        self.lock = threading.Lock()
+        self.selected = None
+        self.token = 0
+        self.exports = []
+        self.url = "http://127.0.0.1:{}/login".format(self.server_address[1])
+
+
+@unittest.skipIf(lloyds is None, "robobrowser is not installed")
+class LloydsExportTest(unittest.TestCase):
+    """Tests for exporting the statements of every account"""
+
+    def setUp(self):
+        self.server = FakeLloydsServer()
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        for name, value in [("LOGIN_URL", self.server.url),
+                            ("prompt", mock.Mock(return_value="x"))]:
+            patcher = mock.patch.object(lloyds, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _download(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return list(lloyds.download_internal("123", datetime.date(2020, 1, 1),
+                                                 datetime.date(2020, 6, 30), **kwargs))
+
+    def test_exports_each_account(self):
+        """Every range is exported while its own account is selected"""
+        downloaded = self._download(workers=4)
+
+        self.assertEqual([name for name, _ in downloaded], ACCOUNTS)
+        for name, ranges in downloaded:
+            self.assertEqual([[transaction.description for transaction in transactions]
+                              for transactions in ranges],
+                             [["{} 01/01/2020".format(name)],
+                              ["{} 26/03/2020".format(name)],
+                              ["{} 19/06/2020".format(name)]])
+        self.assertEqual(sorted(self.server.exports),
+                         sorted((name, from_date) for name in ACCOUNTS
+                                for from_date in ["01/01/2020", "26/03/2020", "19/06/2020"]))
+
+    def test_archives_exports(self):
+        """The exported csv files are saved to the archive directory"""
+        with tempfile.TemporaryDirectory() as archive_dir:
+            self._download(workers=1, archive_dir=archive_dir)
+            self.assertEqual(len(os.listdir(archive_dir)), 3 * len(ACCOUNTS))
+
+
+if __name__ == '__main__':
+    unittest.main()
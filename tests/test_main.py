@@ -0,0 +1,88 @@
+"""
+Tests for the batch commands of the main script
+"""
+import contextlib
+import io
+import json
+import subprocess
+import sys
+from unittest import mock
+
+from nebraska import main as main_module
+from nebraska import session as session_module
+from nebraska.account import Account
+from nebraska.transaction import Transaction
+from tests.test_session import REPO_DIR, SessionTestCase
+
+
+class BatchCommandTest(SessionTestCase):
+    """Tests for running a single command and exiting"""
+
+    def run_main(self, *argv):
+        """Run the main script with the arguments, returning what it printed to stdout"""
+        output = io.StringIO()
+        with mock.patch.object(sys, "argv", ["nebraska"] + list(argv)), \
+                mock.patch("cli.sessionmode.SessionPrompt") as prompt, \
+                contextlib.redirect_stdout(output):
+            main_module.main(main_module.parseargs())
+        prompt.assert_not_called()
+        return output.getvalue()
+
+    def test_report_net(self):
+        """The net report is printed as json or csv"""
+        self.assertEqual(json.loads(self.run_main("report", "net")),
+                         {"income": 2000.0, "spending": -650.0, "net": 1350.0})
+        self.assertEqual(self.run_main("report", "net", "--from", "2020-02-01", "--format", "csv"),
+                         "income,spending,net\r\n1000.0,-30.0,970.0\r\n")
+
+    def test_report_breakdown(self):
+        """The breakdown is printed by category, for whole months or any dates"""
+        for dates in [["--from", "2020-01-01", "--to", "2020-01-31"],
+                      ["--from", "2019-12-15", "--to", "2020-01-31"]]:
+            self.assertEqual(json.loads(self.run_main("report", "breakdown", *dates)),
+                             {"income": [{"category": "Unknown", "amount": 1000.0}],
+                              "spending": [{"category": "Bills", "amount": -600.0},
+                                           {"category": "Food", "amount": -20.0}]})
+        self.assertEqual(self.run_main("report", "breakdown", "--to", "2020-01-31",
+                                       "--format", "csv"),
+                         "type,category,amount\r\nincome,Unknown,1000.0\r\n"
+                         "spending,Bills,-600.0\r\nspending,Food,-20.0\r\n")
+
+    def test_export(self):
+        """The cached transactions are printed as json or csv"""
+        rows = json.loads(self.run_main("export", "--from", "2020-02-01"))
+        self.assertEqual(rows, [
+            {"account": "current", "date": "2020-02-01", "description": "SALARY",
+             "counterparty": None, "amount": 1000.0, "balance_after": 1880.0,
+             "category": "Unknown"},
+            {"account": "current", "date": "2020-02-03", "description": "TESCO",
+             "counterparty": None, "amount": -30.0, "balance_after": 1850.0,
+             "category": "Food"},
+        ])
+        self.assertEqual(self.run_main("export", "--to", "2020-01-01", "--format", "csv"),
+                         "account,date,description,counterparty,amount,balance_after,category"
+                         "\r\ncurrent,2020-01-01,SALARY,,1000.0,1500.0,Unknown\r\n")
+
+    def test_sync(self):
+        """New transactions are downloaded and saved, and their counts printed"""
+        fresh = [Account("current", [Transaction("2020-02-10", "RENT", -60000, 125000)])]
+        with mock.patch.object(session_module, "download_all_transactions",
+                               return_value={"lloyds": fresh}):
+            self.assertEqual(json.loads(self.run_main("sync")), {"current": 1})
+        self.assertEqual(len(self.load().accounts[0].get_transactions()), 6)
+
+    def test_interactive(self):
+        """Without a command the interactive prompt is started"""
+        with mock.patch.object(sys, "argv", ["nebraska", "--cache"]), \
+                mock.patch("cli.sessionmode.SessionPrompt") as prompt:
+            main_module.main(main_module.parseargs())
+        prompt.assert_called_once()
+        prompt.return_value.cmdloop.assert_called_once_with()
+
+    def test_cli_not_imported(self):
+        """The batch commands don't import the interactive prompt"""
+        output = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, nebraska.main; print('cli.sessionmode' in sys.modules)"],
+            cwd=REPO_DIR, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        self.assertEqual(output.strip(), "False")
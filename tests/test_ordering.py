@@ -0,0 +1,71 @@
+"""
+Tests for the balance-chain ordering of transactions
+"""
+import datetime
+import random
+import unittest
+
+from nebraska.ordering import TransactionOrderError, are_sequential, sort_transactions
+from nebraska.transaction import Transaction
+
+
+def _history(rng, length):
+    """Generate a valid transaction history, in chronological order"""
+    balance = rng.choice([0, 100000])
+    date = datetime.date(2020, 1, 1)
+    history = []
+    for index in range(length):
+        if rng.random() < 0.4:
+            date += datetime.timedelta(days=1)
+        amount = rng.choice([-10000, 10000, -5000, 5000, 0])
+        balance += amount
+        history.append(Transaction(str(date), "row {}".format(index), amount, balance))
+    return history
+
+
+class SortTransactionsTest(unittest.TestCase):
+    """Tests for sort_transactions"""
+
+    def assert_chained(self, transactions):
+        """Check each transaction follows on from the one before"""
+        for before, after in zip(transactions, transactions[1:]):
+            self.assertTrue(are_sequential(before, after), "{} then {}".format(before, after))
+
+    def test_first_day_nets_to_zero(self):
+        """A first day netting to zero starts on the balance the next day needs"""
+        transactions = [Transaction("2020-01-01", "out", -10000, 100000),
+                        Transaction("2020-01-01", "in", 10000, 110000),
+                        Transaction("2020-01-02", "shop", -500, 99500)]
+        ordered = sort_transactions(transactions)
+        self.assertEqual([t.description for t in ordered], ["in", "out", "shop"])
+
+    def test_only_days_net_to_zero(self):
+        """Days which all net to zero are still chained"""
+        transactions = [Transaction("2020-01-01", "out", -10000, 100000),
+                        Transaction("2020-01-01", "in", 10000, 110000),
+                        Transaction("2020-01-02", "out again", -10000, 100000),
+                        Transaction("2020-01-02", "in again", 10000, 110000)]
+        self.assert_chained(sort_transactions(transactions))
+
+    def test_shuffled_histories(self):
+        """Shuffled valid histories are always put back into a chain"""
+        rng = random.Random(0)
+        for _ in range(3000):
+            history = _history(rng, rng.randint(2, 12))
+            shuffled = history[:]
+            rng.shuffle(shuffled)
+            ordered = sort_transactions(shuffled)
+            self.assertEqual(len(ordered), len(history))
+            self.assert_chained(ordered)
+
+    def test_broken_chain(self):
+        """A gap in the balances is reported"""
+        transactions = [Transaction("2020-01-01", "a", -100, 900),
+                        Transaction("2020-01-02", "b", -100, 500)]
+        with self.assertRaises(TransactionOrderError) as context:
+            sort_transactions(transactions)
+        self.assertIn("2020-01-02", context.exception.reason)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests for the Teller requests of the Santander node, against a fake Teller server
+"""
+import contextlib
+import http.server
+import io
+import json
+import threading
+import time
+import unittest
+import urllib.parse
+from unittest import mock
+
+try:
+    import requests
+    from nebraska.banknodes import santander
+except ImportError:
+    santander = None
+
+TRANSACTIONS = [{"id": "txn_{}".format(number), "date": "2020-01-{:02d}".format(number)}
+                for number in range(5, 0, -1)]
+
+
+class FakeTellerHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the server's queued responses, then the transactions a page at a time"""
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        self.server.requests.append(params)
+
+        if self.server.responses:
+            status, delay = self.server.responses.pop(0)
+            time.sleep(delay)
+            body = {"error": status}
+        else:
+            status = 200
+            ids = [transaction["id"] for transaction in TRANSACTIONS]
+            start = 0
+            if "from_id" in params and not self.server.ignore_from_id:
+                start = ids.index(params["from_id"]) + 1
+            body = TRANSACTIONS[start:start + int(params.get("count", len(ids)))]
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *_):
+        pass
+
+
+class FakeTellerServer(http.server.ThreadingHTTPServer):
+    """
+    A local Teller API in a thread. The responses, a list of (status, delay in
+    seconds), are returned in turn before any transactions, and the params of
+    every request are kept in requests. With ignore_from_id every page starts
+    from the newest transaction.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeTellerHandler)
+        self.responses = []
+        self.requests = []
+        self.ignore_from_id = False
+        self.url = "http://127.0.0.1:{}/transactions".format(self.server_address[1])
+
+    def handle_error(self, request, client_address):
+        # The client has given up on a delayed response
+        pass
+
+
+@unittest.skipIf(santander is None, "requests is not installed")
+class TellerRequestsTest(unittest.TestCase):
+    """Tests for the retries and paging of the Teller requests"""
+
+    def setUp(self):
+        self.server = FakeTellerServer()
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        for name, value in [("BACKOFF", 0), ("TIMEOUT", 0.5), ("PAGE_SIZE", 2)]:
+            patcher = mock.patch.object(santander, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _get(self, **params):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return santander._get(self.session, self.server.url, **params)
+
+    def _get_transactions(self, from_date):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return list(santander._get_transactions(self.session, self.server.url, from_date))
+
+    def test_retries_server_errors(self):
+        """429 and 5xx responses are retried until one succeeds"""
+        self.server.responses = [(503, 0), (429, 0), (500, 0)]
+        self.assertEqual(self._get(count=5), TRANSACTIONS)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_gives_up_after_attempts(self):
+        """The request fails once every attempt has failed"""
+        self.server.responses = [(502, 0)] * santander.ATTEMPTS
+        with self.assertRaisesRegex(Exception, "HTTP 502"):
+            self._get()
+        self.assertEqual(len(self.server.requests), santander.ATTEMPTS)
+
+    def test_does_not_retry_client_errors(self):
+        """Other error responses fail straight away"""
+        self.server.responses = [(404, 0)]
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self._get()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_retries_timeouts(self):
+        """A response slower than the timeout is retried"""
+        self.server.responses = [(200, 1)]
+        self.assertEqual(self._get(count=1), TRANSACTIONS[:1])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_fetches_every_page(self):
+        """Pages are fetched from the last id until a short page"""
+        self.assertEqual(self._get_transactions("2019-12-01"), TRANSACTIONS)
+        self.assertEqual(self.server.requests,
+                         [{"count": "2"},
+                          {"count": "2", "from_id": "txn_4"},
+                          {"count": "2", "from_id": "txn_2"}])
+
+    def test_stops_before_from_date(self):
+        """No more pages are fetched once a page reaches before the start date"""
+        self.assertEqual(self._get_transactions("2020-01-03"), TRANSACTIONS[:4])
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_stops_on_an_empty_page(self):
+        """A last page that is exactly full is followed by one empty page"""
+        with mock.patch.object(santander, "PAGE_SIZE", len(TRANSACTIONS)):
+            self.assertEqual(self._get_transactions("2019-12-01"), TRANSACTIONS)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_stops_on_a_repeated_page(self):
+        """A page repeated by a server that ignores from_id is dropped and ends the fetch"""
+        self.server.ignore_from_id = True
+        self.assertEqual(self._get_transactions("2019-12-01"), TRANSACTIONS[:2])
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
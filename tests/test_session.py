@@ -0,0 +1,165 @@
+"""
+Tests for the nebraska session
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from nebraska import session as session_module
+from nebraska.account import Account
+from nebraska.category import CategoryRegistry
+from nebraska.rollup import Rollup
+from nebraska.storage import JsonStore
+from nebraska.transaction import Transaction
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportTest(unittest.TestCase):
+    """Tests for what importing the session pulls in"""
+
+    def test_bank_nodes_not_imported(self):
+        """Importing the session doesn't import the bank nodes' dependencies"""
+        output = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, nebraska.session; "
+             "print(sorted(name for name in ('requests', 'robobrowser') if name in sys.modules))"],
+            cwd=REPO_DIR, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+
+class SessionTestCase(unittest.TestCase):
+    """
+    Base for the session tests, with the session's files in a temporary
+    directory holding a cache of one account
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patchers = [mock.patch.object(session_module, name, self.path(filename))
+                    for name, filename in [("CATEGORIES_FILE", "known_descriptions.json"),
+                                           ("CONFIG_FILE", "config.json"),
+                                           ("ROLLUP_FILE", "rollup.json"),
+                                           ("SYNC_FILE", "sync.json")]]
+        patchers.append(mock.patch.object(session_module, "get_store",
+                                          lambda config: JsonStore(self.path("cache.json"))))
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Keep the session's progress messages out of the test output
+        redirect = contextlib.redirect_stdout(io.StringIO())
+        redirect.__enter__()
+        self.addCleanup(redirect.__exit__, None, None, None)
+
+        categories = CategoryRegistry()
+        categories.create("Food").add_description("TESCO")
+        categories.create("Bills").add_description("RENT")
+        self.write_categories(categories)
+        JsonStore(self.path("cache.json")).save([Account("current", [
+            Transaction("2020-01-01", "SALARY", 100000, 150000),
+            Transaction("2020-01-02", "RENT", -60000, 90000),
+            Transaction("2020-01-20", "TESCO", -2000, 88000),
+            Transaction("2020-02-01", "SALARY", 100000, 188000),
+            Transaction("2020-02-03", "TESCO", -3000, 185000),
+        ])])
+
+    def path(self, name):
+        """Get the path of a file in the temporary directory"""
+        return os.path.join(self.directory, name)
+
+    def write_categories(self, categories):
+        """Write the categories file"""
+        with open(self.path("known_descriptions.json"), "w") as categories_file:
+            json.dump(categories.to_dict(), categories_file)
+
+    def load(self):
+        """Load a new session"""
+        session = session_module.Session()
+        session.load()
+        return session
+
+
+class RollupTest(SessionTestCase):
+    """Tests that the session's monthly totals match those built from scratch"""
+
+    def assert_rollup_built(self, session, rollup=None):
+        """
+        Check the session's monthly totals are those built from its
+        transactions, and are still the given rollup if any
+        """
+        if rollup is not None:
+            self.assertIs(session.get_rollup(), rollup)
+        self.assertEqual(session.get_rollup().totals,
+                         Rollup.build(session.accounts, session.categories).totals)
+
+    def test_update(self):
+        """Downloaded transactions are added to the totals"""
+        session = self.load()
+        rollup = session.get_rollup()
+        fresh = [Account("current", [Transaction("2020-02-03", "TESCO", -3000, 185000),
+                                     Transaction("2020-02-10", "RENT", -60000, 125000),
+                                     Transaction("2020-03-01", "SALARY", 100000, 225000)]),
+                 Account("savings", [Transaction("2020-01-05", "INTEREST", 29, 1029)])]
+        with mock.patch.object(session_module, "download_all_transactions",
+                               return_value={"lloyds": fresh}):
+            self.assertEqual(session.update(), {"current": 2, "savings": 1})
+        self.assert_rollup_built(session, rollup)
+
+    def test_set_category_override(self):
+        """Transactions move between categories as their overrides change"""
+        session = self.load()
+        rollup = session.get_rollup()
+        account = session.accounts[0]
+        transactions = account.get_transactions()
+        bills = session.categories.get_category("Bills")
+        session.set_category_override(account, transactions[2], bills)
+        session.set_category_override(account, transactions[3], bills)
+        self.assert_rollup_built(session, rollup)
+        session.set_category_override(account, transactions[2], None)
+        self.assert_rollup_built(session, rollup)
+
+    def test_reuses_saved_totals(self):
+        """The saved totals are used while the cache and categories are unchanged"""
+        session = self.load()
+        session.get_rollup()
+        session.save()
+
+        session = self.load()
+        self.assertIsNotNone(session._rollup)
+        self.assert_rollup_built(session)
+
+    def test_ignores_totals_after_categories_change(self):
+        """The saved totals are rebuilt if the categories have changed"""
+        session = self.load()
+        session.get_rollup()
+        session.save()
+
+        session.categories.get_category("Food").add_description("SALARY")
+        self.write_categories(session.categories)
+        session = self.load()
+        self.assertIsNone(session._rollup)
+        self.assert_rollup_built(session)
+
+    def test_ignores_totals_after_cache_change(self):
+        """The saved totals are rebuilt if the cache has been written since"""
+        session = self.load()
+        session.get_rollup()
+        session.save()
+
+        session.accounts[0].add_transaction(Transaction("2020-02-04", "TESCO", -1000, 184000))
+        JsonStore(self.path("cache.json")).save(session.accounts)
+        session = self.load()
+        self.assertIsNone(session._rollup)
+        self.assert_rollup_built(session)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+"""
+Tests for the stores holding the accounts between runs
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from nebraska.account import Account
+from nebraska.category import CategoryRegistry
+from nebraska.common import write_json_atomic
+from nebraska.storage import (JournalStore, JsonStore, SqliteStore, _keyed, _override_name,
+                              _read_snapshot, _write_snapshot)
+from nebraska.transaction import Transaction
+
+
+def make_categories():
+    """Make a registry with a category to override transactions with"""
+    categories = CategoryRegistry()
+    categories.create("Bills").add_description("RENT")
+    return categories
+
+
+def make_accounts(categories):
+    """Make accounts with counterparties, overrides and identical transactions"""
+    current = Account("current", [
+        Transaction("2020-01-01", "SALARY", 100000, 150000),
+        Transaction("2020-01-02", "RENT", -60000, 90000,
+                    category_override=categories.get_category("Bills")),
+        Transaction("2020-01-02", "SHOP", -1000, 89000, counterparty="AMAZON"),
+        Transaction("2020-01-03", "TRANSFER", -500, 88500),
+        Transaction("2020-01-03", "TRANSFER", 500, 89000),
+        Transaction("2020-01-03", "TRANSFER", -500, 88500),
+    ])
+    return [current, Account("savings", [Transaction("2020-01-05", "INTEREST", 29, 1029)]),
+            Account("empty")]
+
+
+def as_dicts(accounts):
+    """Get the accounts as dicts, to compare them"""
+    return [account.to_dict() for account in accounts]
+
+
+class StoreTestCase(unittest.TestCase):
+    """Base for the store tests, in a temporary directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.categories = make_categories()
+        self.accounts = make_accounts(self.categories)
+        # Keep the stores' progress messages out of the test output
+        self.stdout = io.StringIO()
+        redirect = contextlib.redirect_stdout(self.stdout)
+        redirect.__enter__()
+        self.addCleanup(redirect.__exit__, None, None, None)
+
+    def path(self, name):
+        """Get the path of a file in the temporary directory"""
+        return os.path.join(self.directory, name)
+
+
+class SnapshotTest(StoreTestCase):
+    """Tests for _write_snapshot and _read_snapshot"""
+
+    def test_round_trip(self):
+        """The accounts and header read back are those written"""
+        _write_snapshot(self.path("cache.json"), self.accounts, generation=3)
+        header, accounts = _read_snapshot(self.path("cache.json"), self.categories)
+        self.assertEqual(header, {"generation": 3})
+        self.assertEqual(as_dicts(accounts), as_dicts(self.accounts))
+        self.assertIs(accounts[0].get_transactions()[1].get_category_override(),
+                      self.categories.get_category("Bills"))
+
+    def test_valid_json(self):
+        """The snapshot is a json file with a transaction per line"""
+        _write_snapshot(self.path("cache.json"), self.accounts)
+        with open(self.path("cache.json"), "r") as infile:
+            self.assertEqual(json.load(infile), {"accounts": as_dicts(self.accounts)})
+            infile.seek(0)
+            # The header and closing lines, plus a line for each account's
+            # name, end and transactions
+            self.assertEqual(len(infile.readlines()), 2 + 2 * len(self.accounts) + 7)
+
+    def test_no_accounts(self):
+        """An empty list of accounts is written and read back"""
+        _write_snapshot(self.path("cache.json"), [])
+        self.assertEqual(_read_snapshot(self.path("cache.json"), self.categories), ({}, []))
+
+    def test_legacy_cache(self):
+        """A cache written by json.dump with indent=4 is read in one go"""
+        write_json_atomic(self.path("cache.json"),
+                          {"accounts": as_dicts(self.accounts)}, indent=4, sort_keys=True)
+        header, accounts = _read_snapshot(self.path("cache.json"), self.categories)
+        self.assertEqual(header, {})
+        self.assertEqual(as_dicts(accounts), as_dicts(self.accounts))
+        self.assertIs(accounts[0].get_transactions()[1].get_category_override(),
+                      self.categories.get_category("Bills"))
+
+
+class JournalStoreTest(StoreTestCase):
+    """Tests for JournalStore"""
+
+    def store(self, **kwargs):
+        """Create a journal store in the temporary directory"""
+        return JournalStore(self.path("cache.json"), self.path("cache.journal"), **kwargs)
+
+    def change(self, accounts):
+        """Add a transaction and an override to the accounts"""
+        accounts[0].add_transaction(Transaction("2020-01-04", "SHOP", -100, 88400))
+        accounts[0].get_transactions()[0].set_category_override(
+            self.categories.get_category("Bills"))
+
+    def saved_changes(self):
+        """Load the saved accounts into a new store and save two changes"""
+        store = self.store()
+        accounts = store.load(self.categories)
+        self.change(accounts)
+        store.save(accounts)
+        return accounts
+
+    def journal_lines(self):
+        """Get the lines of the journal"""
+        with open(self.path("cache.journal"), "r") as journal:
+            return journal.readlines()
+
+    def test_saves_changes_to_journal(self):
+        """Only the changes are appended to the journal, and are replayed on load"""
+        self.store().save(self.accounts)
+        with open(self.path("cache.json"), "r") as snapshot:
+            written = snapshot.read()
+
+        accounts = self.saved_changes()
+        with open(self.path("cache.json"), "r") as snapshot:
+            self.assertEqual(snapshot.read(), written)
+        self.assertEqual(json.loads(self.journal_lines()[0]), {"generation": 1})
+        self.assertEqual(sorted(json.loads(line)["op"] for line in self.journal_lines()[1:]),
+                         ["add", "override"])
+        self.assertEqual(as_dicts(self.store().load(self.categories)), as_dicts(accounts))
+
+    def test_truncates_incomplete_entry(self):
+        """A partly written last entry is dropped, and later saves still load"""
+        self.store().save(self.accounts)
+        accounts = self.saved_changes()
+        complete = os.path.getsize(self.path("cache.journal"))
+        with open(self.path("cache.journal"), "a") as journal:
+            journal.write('{"account": "current", "op": "ad')
+
+        store = self.store()
+        loaded = store.load(self.categories)
+        self.assertEqual(as_dicts(loaded), as_dicts(accounts))
+        self.assertEqual(os.path.getsize(self.path("cache.journal")), complete)
+
+        loaded[1].add_transaction(Transaction("2020-01-06", "INTEREST", 1, 1030))
+        store.save(loaded)
+        self.assertEqual(as_dicts(self.store().load(self.categories)), as_dicts(loaded))
+
+    def test_discards_stale_journal(self):
+        """A journal from before the snapshot was last written is removed unread"""
+        self.store().save(self.accounts)
+        accounts = self.saved_changes()
+        # As if the last compaction wrote its snapshot but didn't get to remove the journal
+        _write_snapshot(self.path("cache.json"), accounts, generation=2)
+
+        self.assertEqual(as_dicts(self.store().load(self.categories)), as_dicts(accounts))
+        self.assertFalse(os.path.exists(self.path("cache.journal")))
+
+    def test_compacts(self):
+        """The journal is folded into a new snapshot once it passes compact_after entries"""
+        self.store(compact_after=3).save(self.accounts)
+        store = self.store(compact_after=3)
+        accounts = store.load(self.categories)
+        self.change(accounts)
+        store.save(accounts)
+        self.assertEqual(len(self.journal_lines()), 3)
+
+        accounts[1].add_transaction(Transaction("2020-01-06", "INTEREST", 1, 1030))
+        accounts[1].add_transaction(Transaction("2020-01-07", "INTEREST", 1, 1031))
+        store.save(accounts)
+        self.assertFalse(os.path.exists(self.path("cache.journal")))
+        header, snapshot = _read_snapshot(self.path("cache.json"), self.categories)
+        self.assertEqual(header, {"generation": 2})
+        self.assertEqual(as_dicts(snapshot), as_dicts(accounts))
+
+
+# The schema before amounts and balances were held in integer pence
+_POUNDS_SCHEMA = """
+CREATE TABLE accounts (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE transactions (
+    account TEXT NOT NULL REFERENCES accounts (name),
+    fingerprint TEXT NOT NULL,
+    occurrence INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    balance_after REAL NOT NULL,
+    counterparty TEXT,
+    category_override TEXT,
+    PRIMARY KEY (account, fingerprint, occurrence)
+);
+CREATE INDEX transactions_by_date ON transactions (account, date);
+CREATE INDEX transactions_by_fingerprint ON transactions (fingerprint);
+"""
+
+
+class SqliteStoreTest(StoreTestCase):
+    """Tests for SqliteStore"""
+
+    def store(self):
+        """Create an SQLite store in the temporary directory"""
+        return SqliteStore(self.path("cache.sqlite3"), self.path("cache.json"))
+
+    def written(self, store, function):
+        """Get the number of rows the function writes to the store's database"""
+        before = store._connect().total_changes
+        function()
+        return store._connect().total_changes - before
+
+    def test_migrates_json_cache(self):
+        """An existing json cache is copied into the database once"""
+        JsonStore(self.path("cache.json")).save(self.accounts)
+        self.assertEqual(as_dicts(self.store().load(self.categories)), as_dicts(self.accounts))
+        self.assertIn("Migrating", self.stdout.getvalue())
+
+        JsonStore(self.path("cache.json")).save(self.accounts[:1])
+        self.assertEqual(as_dicts(self.store().load(self.categories)), as_dicts(self.accounts))
+        self.assertEqual(self.stdout.getvalue().count("Migrating"), 1)
+
+    def test_loads_accounts_when_used(self):
+        """Accounts are read when used, and saving writes only the changed rows"""
+        self.store().save(self.accounts)
+        store = self.store()
+        accounts = store.load(self.categories)
+        self.assertEqual([account.name for account in accounts], ["current", "savings", "empty"])
+        self.assertFalse(any(account.is_loaded() for account in accounts))
+        self.assertEqual(self.written(store, lambda: store.save(accounts)), 0)
+
+        accounts[0].add_transaction(Transaction("2020-01-04", "SHOP", -100, 88400))
+        accounts[0].get_transactions()[0].set_category_override(
+            self.categories.get_category("Bills"))
+        self.assertEqual(self.written(store, lambda: store.save(accounts)), 2)
+        self.assertFalse(accounts[1].is_loaded())
+        self.assertEqual(self.written(store, lambda: store.save(accounts)), 0)
+
+        self.assertEqual(as_dicts(self.store().load(self.categories)), as_dicts(accounts))
+
+    def test_upgrades_pounds_to_pence(self):
+        """A database holding pounds is converted to pence, keeping each row's fingerprint"""
+        connection = sqlite3.connect(self.path("cache.sqlite3"))
+        with connection:
+            connection.executescript(_POUNDS_SCHEMA)
+            for account in self.accounts:
+                connection.execute("INSERT INTO accounts VALUES (?)", (account.name,))
+                for key, transaction in _keyed(account.get_transactions()):
+                    connection.execute(
+                        "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (account.name,) + key
+                        + (transaction.date, transaction.description, transaction.amount,
+                           transaction.balance_after, transaction.counterparty,
+                           _override_name(transaction)))
+        connection.close()
+
+        store = self.store()
+        accounts = store.load(self.categories)
+        self.assertEqual(as_dicts(accounts), as_dicts(self.accounts))
+        self.assertEqual([transaction.amount_pence
+                          for transaction in accounts[0].get_transactions()],
+                         [100000, -60000, -1000, -500, 500, -500])
+        self.assertEqual(accounts[1].get_transactions()[0].amount_pence, 29)
+        self.assertEqual(store._connect().execute("PRAGMA user_version").fetchone(), (1,))
+        self.assertEqual(self.written(store, lambda: store.save(accounts)), 0)
+
+        stamp = store.stamp()
+        self.store().load(self.categories)[0].get_transactions()
+        self.assertEqual(self.store().stamp(), stamp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,4 +5,5 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('account-balances.json', views.json, name='json'),
+    path('breakdown.json', views.breakdown, name='breakdown'),
 ]
\ No newline at end of file
@@ -1,57 +1,92 @@
-import datetime
+import hashlib
+import os
+import threading
 
-import itertools
 from django.shortcuts import render
 from django.http import JsonResponse
+from django.views.decorators.http import condition
 
+from nebraska.aggregate import GROUPS, aggregate, net_groups
+from nebraska.analytics import Analytics
+from nebraska.common import CATEGORIES_FILE
+from nebraska.money import pence_to_pounds
 from nebraska.session import Session
+from nebraska.storage import get_store
 
+# The session loaded from the cache and the balance series computed from it,
+# kept for the life of the process and reloaded only when the cache changes
+_LOADED = {"stamp": None, "session": None, "balances": None}
+_LOADED_LOCK = threading.Lock()
 
-# Create your views here.
-def json(requests):
-    session = Session()
-    session.load()
-
-    all_transactions = sorted(itertools.chain.from_iterable([a.get_transactions() for a in session.accounts]),
-                              key=lambda x: x.date)
-
-    from_date = all_transactions[0].date.split("-")
-    to_date = all_transactions[-1].date.split("-")
-
-    from_date = datetime.date(int(from_date[0]), int(from_date[1]), int(from_date[2]))
-    to_date = datetime.date(int(to_date[0]), int(to_date[1]), int(to_date[2]))
-
-    delta = to_date - from_date
 
-    # Get the set of date strings in the required range
-    dates = []
-    for i in range(delta.days + 1):
-        dates.append(str(from_date + datetime.timedelta(days=i)))
-
-    # Reverse the dates so the balance can be tracked backwards
-    dates.reverse()
-
-    balances = {}
-    for account in session.accounts:
-        if not account.get_transactions():
-            continue
-        balances[account.name] = [0] * len(dates)
-        for idx, date in enumerate(dates):
-            previous_transactions = account.get_transactions(to_date=date)
-            if previous_transactions:
-                balances[account.name][idx] = previous_transactions[-1].balance_after
-            else:
-                future_transactions = account.get_transactions(from_date=date)
-                balances[account.name][idx] = future_transactions[0].balance_after - future_transactions[0].amount
-
-    balances["total"] = [sum([balances[account][idx] for account in balances]) for idx in range(len(dates))]
+def _cache_stamp():
+    """Get a stamp which changes whenever the cache or the categories are written to"""
+    session = Session()
+    session.load_config()
+    try:
+        stat = os.stat(CATEGORIES_FILE)
+    except FileNotFoundError:
+        categories = None
+    else:
+        categories = (stat.st_mtime_ns, stat.st_size)
+    return (get_store(session.config).stamp(), categories)
+
+
+def _cache_etag(requests):
+    return hashlib.sha1(repr((_cache_stamp(), requests.get_full_path()))
+                        .encode("utf-8")).hexdigest()
+
+
+def _loaded():
+    """Get the loaded session and balances, reloading them if the cache has changed"""
+    stamp = _cache_stamp()
+    with _LOADED_LOCK:
+        if _LOADED["session"] is None or _LOADED["stamp"] != stamp:
+            session = Session()
+            session.load()
+            dates, balances = Analytics.from_session(session).daily_balances()
+            _LOADED["stamp"] = stamp
+            _LOADED["session"] = session
+            _LOADED["balances"] = {"dates": dates, "balances": balances}
+        return dict(_LOADED)
 
-    # Put all the dates back in order
-    dates.reverse()
-    for key in balances:
-        balances[key].reverse()
 
-    return JsonResponse({"dates": dates, "balances": balances})
+# Create your views here.
+@condition(etag_func=_cache_etag)
+def json(requests):
+    return JsonResponse(_loaded()["balances"])
+
+
+@condition(etag_func=_cache_etag)
+def breakdown(requests):
+    """
+    Income and spending totals, netted off by group
+
+    Takes optional "from" and "to" dates and a comma separated "group_by" of
+    account, category and/or month (default category).
+    """
+    group_by = requests.GET.get("group_by", "category").split(",")
+    if any(name not in GROUPS for name in group_by):
+        return JsonResponse({"error": "group_by must be from: {}".format(", ".join(GROUPS))},
+                            status=400)
+
+    session = _loaded()["session"]
+    try:
+        income, spending = net_groups(*aggregate(session.accounts, session.categories,
+                                                 from_date=requests.GET.get("from"),
+                                                 to_date=requests.GET.get("to"),
+                                                 group_by=group_by))
+    except ValueError as err:
+        return JsonResponse({"error": str(err)}, status=400)
+
+    def rows(totals):
+        named = [([part.get_name() if name == "category" else part
+                   for name, part in zip(group_by, key)], total)
+                 for key, total in totals.items()]
+        return [dict(zip(group_by, parts), amount=pence_to_pounds(total))
+                for parts, total in sorted(named)]
+
+    return JsonResponse({"income": rows(income), "spending": rows(spending)})
 
 
 def index(requests):